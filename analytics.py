@@ -0,0 +1,120 @@
+# Optional: `uv pip install -e ".[analytics]"`; the rest of the app runs without it
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+# Matrix entry for "no vote in this category"
+NO_VOTE = -1
+
+
+class VoteMatrix:
+    # Votes as a voters x categories int32 matrix of clip indexes in catalog
+    # order, NO_VOTE where a voter skipped a category. Votes for clips that
+    # are no longer in config.toml count as NO_VOTE and are reported as
+    # unmapped. Every report below is a handful of array operations.
+
+    def __init__(self, votes, catalog):
+        if np is None:
+            raise RuntimeError("vote analytics need NumPy: uv pip install -e \".[analytics]\"")
+        self.catalog = catalog
+        self.categories = catalog.ordered
+        self.voters = list(votes)
+        columns = {c.id: i for i, c in enumerate(self.categories)}
+        slug_index = [{slug: clip.index for slug, clip in c.by_slug.items()} for c in self.categories]
+
+        rows, cols, clips = [], [], []
+        self.unmapped = 0
+        for row, user_votes in enumerate(votes.values()):
+            for category_id, slug in user_votes.items():
+                col = columns.get(category_id)
+                clip_index = slug_index[col].get(slug) if col is not None else None
+                if clip_index is None:
+                    self.unmapped += 1
+                    continue
+                rows.append(row)
+                cols.append(col)
+                clips.append(clip_index)
+        self.matrix = np.full((len(self.voters), len(self.categories)), NO_VOTE, dtype=np.int32)
+        self.matrix[np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)] = clips
+        self.voted = self.matrix != NO_VOTE
+
+    def counts(self, rows=None):
+        # Votes per clip, one array per category; rows limits it to some voters
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        return [np.bincount(col[col != NO_VOTE], minlength=len(category.clips))
+                for category, col in zip(self.categories, matrix.T)]
+
+    def complete_voters(self):
+        # Voters who voted in every category
+        return self.voted.all(axis=1)
+
+    def overlap(self):
+        # categories x categories: voters who voted in both, and the Jaccard
+        # index (both / either); the diagonal is each category's voter count
+        voted = self.voted.astype(np.int32)
+        both = voted.T @ voted
+        per_category = np.diag(both)
+        either = per_category[:, None] + per_category[None, :] - both
+        jaccard = np.divide(both, either, out=np.zeros(both.shape), where=either > 0)
+        return both, jaccard
+
+    def creator_tallies(self, counts):
+        # Alternative standings by clip creator. Approval: voters who picked at
+        # least one of the creator's clips. Borda: within each category a clip
+        # scores one point per clip with fewer votes, summed per creator.
+        creators = sorted({clip.creator or "" for c in self.categories for clip in c.clips})
+        creator_ids = {name: i for i, name in enumerate(creators)}
+        approved = np.zeros((len(self.voters), len(creators)), dtype=bool)
+        borda = np.zeros(len(creators), dtype=np.int64)
+        votes = np.zeros(len(creators), dtype=np.int64)
+        for category, col, category_counts in zip(self.categories, self.matrix.T, counts):
+            if not category.clips:
+                continue
+            clip_creator = np.array([creator_ids[clip.creator or ""] for clip in category.clips], dtype=np.intp)
+            rows = np.flatnonzero(col != NO_VOTE)
+            approved[rows, clip_creator[col[rows]]] = True
+            points = (category_counts[None, :] < category_counts[:, None]).sum(axis=1)
+            np.add.at(borda, clip_creator, points)
+            np.add.at(votes, clip_creator, category_counts)
+        approval = approved.sum(axis=0)
+        order = np.lexsort((-approval, -borda))
+        return [{"creator": creators[i] or None, "borda": int(borda[i]), "approval": int(approval[i]),
+                 "votes": int(votes[i])} for i in order]
+
+    def report(self):
+        counts = self.counts()
+        complete = self.complete_voters()
+        complete_counts = self.counts(complete)
+        both, jaccard = self.overlap()
+        categories = []
+        for category, category_counts, winners in zip(self.categories, counts, complete_counts):
+            total = int(category_counts.sum())
+            shares = category_counts / total if total else np.zeros(len(category_counts))
+            categories.append({
+                "id": category.id,
+                "name": category.name,
+                "voters": total,
+                "clips": [
+                    {"index": clip.index, "slug": clip.slug, "title": clip.title, "creator": clip.creator,
+                     "votes": int(category_counts[i]), "share": round(float(shares[i]), 4),
+                     "complete_voter_votes": int(winners[i])}
+                    for i, clip in enumerate(category.clips)
+                ],
+            })
+        return {
+            "voters": len(self.voters),
+            "complete_voters": int(complete.sum()),
+            "unmapped_votes": self.unmapped,
+            "categories": categories,
+            "overlap": {
+                "categories": [c.id for c in self.categories],
+                "voters": both.tolist(),
+                "jaccard": np.round(jaccard, 4).tolist(),
+            },
+            "creators": self.creator_tallies(counts),
+        }
+
+
+def build_report(votes, catalog):
+    return VoteMatrix(votes, catalog).report()
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import urllib.request
+from pathlib import Path
+
+# Optional: Brotli siblings and WebP/AVIF backgrounds are skipped without these
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+try:
+    from PIL import Image
+except ModuleNotFoundError:
+    Image = None
+
+BOOTSTRAP_VERSION = "5.3.0"
+BOOTSTRAP_CSS_URL = f"https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP_VERSION}/dist/css/bootstrap.min.css"
+BOOTSTRAP_NAME = "vendor/bootstrap.min.css"
+
+# Files from static/ that go through the pipeline (logical names)
+SOURCES = ["custom.css", "img/background.png", "logo.mp4"]
+# Only text formats are worth precompressing; png/mp4 are compressed already
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt"}
+
+MANIFEST_NAME = "manifest.json"
+
+
+def fingerprint_name(name, data):
+    path = Path(name)
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def used_classes(template_dir):
+    # Every class token that appears in a class="..." attribute; Jinja
+    # expressions inside the attribute just contribute a few harmless extras
+    classes = set()
+    for template in Path(template_dir).glob("*.html"):
+        for attr in re.findall(r'class="([^"]*)"', template.read_text(encoding="utf-8")):
+            classes.update(re.findall(r"[A-Za-z][\w-]*", attr))
+    return classes
+
+
+def _split_blocks(css):
+    # Yield (prelude, body) for each top-level block, body without the braces
+    i, n = 0, len(css)
+    while i < n:
+        start = css.find("{", i)
+        if start == -1:
+            return
+        depth, j = 1, start + 1
+        while depth and j < n:
+            if css[j] == "{":
+                depth += 1
+            elif css[j] == "}":
+                depth -= 1
+            j += 1
+        yield css[i:start].strip(), css[start + 1:j - 1]
+        i = j
+
+
+_CLASS_RE = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+
+
+def purge_css(css, keep):
+    # Drop selectors that reference a class no template uses. Element, :root
+    # and attribute selectors are kept; @media/@supports are purged recursively.
+    out = []
+    for prelude, body in _split_blocks(css):
+        if prelude.startswith(("@media", "@supports", "@layer")):
+            inner = purge_css(body, keep)
+            if inner:
+                out.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@"):
+            out.append(f"{prelude}{{{body}}}")
+        else:
+            selectors = [s for s in prelude.split(",")
+                         if all(c in keep for c in _CLASS_RE.findall(s))]
+            if selectors:
+                out.append(f"{','.join(s.strip() for s in selectors)}{{{body}}}")
+    return "".join(out)
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    # Only after the colon: a space before it can be a descendant combinator
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def _write_atomic(path, data):
+    # A running app may be serving the file under the same hashed name
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write(out_dir, name, data, manifest):
+    hashed = fingerprint_name(name, data)
+    target = out_dir / hashed
+    target.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(target, data)
+    if target.suffix in COMPRESSIBLE:
+        # mtime=0 keeps the .gz byte-identical across builds
+        _write_atomic(Path(f"{target}.gz"), gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomic(Path(f"{target}.br"), brotli.compress(data, quality=11))
+    manifest[name] = hashed
+    return hashed
+
+
+def _prune(out_dir, *manifests):
+    # Delete everything no manifest refers to, precompressed siblings included
+    keep = {MANIFEST_NAME}
+    for manifest in manifests:
+        for hashed in manifest.values():
+            keep.update((hashed, f"{hashed}.gz", f"{hashed}.br"))
+    removed = 0
+    for path in out_dir.rglob("*"):
+        if path.is_file() and path.relative_to(out_dir).as_posix() not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def _image_variants(src_path):
+    variants = {}
+    if Image is None:
+        return variants
+    from io import BytesIO
+    with Image.open(src_path) as img:
+        for fmt, mime, options in (("avif", "image/avif", {"quality": 50}),
+                                   ("webp", "image/webp", {"quality": 80, "method": 6})):
+            buf = BytesIO()
+            try:
+                img.save(buf, fmt.upper(), **options)
+            except (KeyError, OSError, ValueError):
+                continue  # this Pillow build has no encoder for the format
+            variants[fmt] = (mime, buf.getvalue())
+    return variants
+
+
+def build(static_dir, template_dir, out_dir, bootstrap_source=None, log=print):
+    # Write fingerprinted (and precompressed) copies of the static assets to
+    # out_dir plus a manifest.json mapping logical names to them. The files
+    # of the previous build stay: workers that have not restarted yet, and
+    # pages rendered before the deploy, still link to them. Anything older
+    # is pruned.
+    static_dir, out_dir = Path(static_dir), Path(out_dir)
+    # Fetch first so a network failure leaves the previous build in place
+    if bootstrap_source:
+        full = Path(bootstrap_source).read_text(encoding="utf-8")
+    else:
+        with urllib.request.urlopen(BOOTSTRAP_CSS_URL, timeout=30) as resp:
+            full = resp.read().decode("utf-8")
+
+    previous = load_manifest(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+
+    # Background first: custom.css references it
+    background = "img/background.png"
+    png = (static_dir / background).read_bytes()
+    png_url = _write(out_dir, background, png, manifest)
+    sources = [f"url('/assets/{png_url}') type('image/png')"]
+    for fmt, (mime, data) in _image_variants(static_dir / background).items():
+        name = f"img/background.{fmt}"
+        hashed = _write(out_dir, name, data, manifest)
+        sources.insert(0, f"url('/assets/{hashed}') type('{mime}')")
+        log(f"  {name}: {len(data) // 1024} KB (png: {len(png) // 1024} KB)")
+
+    css = (static_dir / "custom.css").read_text(encoding="utf-8")
+    background_decl = f"background-image: url('/assets/{png_url}');"
+    if len(sources) > 1:
+        # Plain url() first for browsers without image-set(); the rest pick AVIF/WebP
+        background_decl += f" background-image: image-set({', '.join(sources)});"
+    css = re.sub(r"background-image:\s*url\(['\"]?/static/img/background\.png['\"]?\);",
+                 lambda m: background_decl, css)
+    _write(out_dir, "custom.css", minify_css(css).encode("utf-8"), manifest)
+
+    for name in SOURCES:
+        if name not in manifest:
+            _write(out_dir, name, (static_dir / name).read_bytes(), manifest)
+
+    subset = minify_css(purge_css(minify_css(full), used_classes(template_dir)))
+    _write(out_dir, BOOTSTRAP_NAME, subset.encode("utf-8"), manifest)
+    log(f"  {BOOTSTRAP_NAME}: {len(subset) // 1024} KB of {len(full) // 1024} KB")
+
+    _write_atomic(out_dir / MANIFEST_NAME, json.dumps(manifest, indent=2).encode("utf-8"))
+    removed = _prune(out_dir, manifest, previous)
+    if removed:
+        log(f"  removed {removed} files from builds before the previous one")
+    return manifest
+
+
+def load_manifest(out_dir):
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
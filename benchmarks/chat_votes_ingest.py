@@ -0,0 +1,81 @@
+"""Throughput and memory of chat vote ingestion.
+
+Writes a synthetic IRC log (one !vote in --vote-every lines, the rest plain
+chat) to a temporary file, then streams it through collect_chat_votes the
+way `flask votes import-chat` does, against the real config.toml:
+
+    python benchmarks/chat_votes_ingest.py --lines 3000000
+
+Peak memory should stay flat as --lines grows; it depends on --voters.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog import load_catalog  # noqa: E402
+from chat_votes import collect_chat_votes  # noqa: E402
+
+IRC = ":{u}!{u}@{u}.tmi.twitch.tv PRIVMSG #cherryylein :{m}\n"
+CHATTER = ["KEKW", "LUL das war so gut", "hallo chat", "!commands", "PogChamp PogChamp", "wer ist das"]
+
+
+def write_log(path, catalog, lines, voters, vote_every):
+    rng = random.Random(0)
+    categories = [c for c in catalog.ordered if c.clips]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            user = f"viewer{rng.randrange(voters)}"
+            if i % vote_every == 0:
+                category = rng.choice(categories)
+                message = f"!vote {category.id} {rng.randint(1, len(category.clips))}"
+            else:
+                message = rng.choice(CHATTER)
+            f.write(IRC.format(u=user, m=message))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--voters", type=int, default=20_000)
+    parser.add_argument("--vote-every", type=int, default=20, help="one vote per this many lines")
+    parser.add_argument("--config", default=str(ROOT / "config.toml"))
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.config)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "chat.log"
+        write_log(path, catalog, args.lines, args.voters, args.vote_every)
+        size_mb = path.stat().st_size / 1e6
+
+        with open(path, "r", encoding="utf-8") as f:
+            t0 = time.perf_counter()
+            votes, stats = collect_chat_votes(f, catalog)
+            elapsed = time.perf_counter() - t0
+
+        tracemalloc.start()
+        with open(path, "r", encoding="utf-8") as f:
+            collect_chat_votes(f, catalog)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(json.dumps({
+        "lines": stats.lines,
+        "log_mb": round(size_mb, 1),
+        "votes": stats.votes,
+        "voters": len(votes),
+        "seconds": round(elapsed, 2),
+        "million_lines_per_minute": round(stats.lines / elapsed * 60 / 1e6, 1),
+        "peak_kb": peak // 1024,
+    }))
+
+
+if __name__ == "__main__":
+    main()
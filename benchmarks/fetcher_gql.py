@@ -0,0 +1,103 @@
+"""GraphQL requests and wall time for resolving every clip, old vs. batched.
+
+Runs against a local stub of Twitch's GraphQL endpoint (twitch_stub.py) with
+the clip URLs from clip_fetcher/clips_*.json, all categories at once like
+fetcher.py does:
+
+    python benchmarks/fetcher_gql.py --latency 0.08
+
+"per-clip" is the previous behaviour: one POST per user agent (4) per clip,
+slug formatted into the query. "batched" is GqlClipResolver. Both modes run
+without the fetcher's shared rate limiter: it paces requests for Twitch, so
+with it the benchmark would measure the limiter and not the request count.
+Both get the fetcher's request slots (8 in flight per host).
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from clip_fetcher.fetcher import (MAX_CONCURRENCY, PER_HOST_LIMIT, USER_AGENTS, GqlClipResolver,  # noqa: E402
+                                  clip_info_from_gql, fetch_with_retries)
+from clip_fetcher.scheduler import RequestSlots  # noqa: E402
+from clip_fetcher.slugs import get_clip_id  # noqa: E402
+from twitch_stub import TwitchStub  # noqa: E402
+
+
+def load_categories():
+    categories = {}
+    for path in sorted((ROOT / "clip_fetcher").glob("clips_*.json")):
+        with open(path, encoding="utf-8") as f:
+            categories[path.stem] = [get_clip_id(c["url"]) for c in json.load(f)]
+    return categories
+
+
+async def per_clip_lookup(session, gql_url, slug, slots):
+    query = {"query": f'query {{ clip(slug: "{slug}") {{ title curator {{ displayName login }} '
+                      f'broadcaster {{ displayName login }} }} }}'}
+    results = await asyncio.gather(*(
+        fetch_with_retries(session, "POST", gql_url, headers={"User-Agent": ua}, json_body=query,
+                           limiter=None, slots=slots)
+        for ua in USER_AGENTS
+    ))
+    for res in results:
+        if isinstance(res, dict) and (res.get("data") or {}).get("clip"):
+            return clip_info_from_gql(res["data"]["clip"])
+    return clip_info_from_gql(None)
+
+
+async def run(mode, stub, categories):
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=MAX_CONCURRENCY)) as session:
+        slots = RequestSlots(MAX_CONCURRENCY, PER_HOST_LIMIT)
+        resolver = GqlClipResolver(session, url=stub.gql_url, limiter=None, slots=slots)
+
+        async def category(slugs):
+            sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+            async def one(slug):
+                async with sem:
+                    if mode == "batched":
+                        return await resolver.resolve(slug)
+                    return await per_clip_lookup(session, stub.gql_url, slug, slots)
+
+            return await asyncio.gather(*(one(s) for s in slugs))
+
+        stub.reset()
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(category(slugs) for slugs in categories.values()))
+        elapsed = time.perf_counter() - t0
+    resolved = sum(1 for infos in results for info in infos if info["title"])
+    return {
+        "mode": mode,
+        "clips": sum(len(s) for s in categories.values()),
+        "resolved": resolved,
+        "gql_requests": stub.gql_requests,
+        "clips_queried": stub.clips_requested,
+        "seconds": round(elapsed, 3),
+    }
+
+
+async def main_async(args):
+    categories = load_categories()
+    async with TwitchStub(latency=args.latency) as stub:
+        for mode in args.modes:
+            print(json.dumps(await run(mode, stub, categories)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.08, help="stub response time in seconds")
+    parser.add_argument("--modes", type=lambda v: v.split(","), default=["per-clip", "batched"])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Throughput against a rate-limited host, with and without the shared limiter.
+
+Fetches clip pages from a local stub (twitch_stub.py) that allows --limit
+requests per second and answers everything above that with 429 +
+Retry-After, using MAX_CONCURRENCY coroutines like fetcher.py:
+
+    python benchmarks/fetcher_rate_limit.py --requests 300 --limit 25
+
+"none" is per-coroutine backoff only; "shared" is HostRateLimiter.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from clip_fetcher.fetcher import MAX_CONCURRENCY, fetch_with_retries  # noqa: E402
+from clip_fetcher.rate_limit import HostRateLimiter  # noqa: E402
+from twitch_stub import TwitchStub  # noqa: E402
+
+
+async def run(mode, stub, requests):
+    limiter = HostRateLimiter() if mode == "shared" else None
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=MAX_CONCURRENCY)) as session:
+        async def one(i):
+            async with sem:
+                return await fetch_with_retries(session, "GET", f"{stub.base_url}/clip{i}",
+                                                retries=6, limiter=limiter)
+
+        stub.reset()
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - t0
+    ok = sum(1 for r in results if r)
+    return {
+        "mode": mode,
+        "ok": ok,
+        "failed": requests - ok,
+        "sent": stub.page_requests,
+        "429s": stub.throttled,
+        "seconds": round(elapsed, 2),
+        "ok_per_second": round(ok / elapsed, 1),
+    }
+
+
+async def main_async(args):
+    async with TwitchStub(latency=args.latency, rate_limit=args.limit) as stub:
+        for mode in args.modes:
+            print(json.dumps(await run(mode, stub, args.requests)))
+            await asyncio.sleep(1.5)  # let the stub's bucket refill between modes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--limit", type=float, default=25, help="requests per second the stub allows")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response time in seconds")
+    parser.add_argument("--modes", type=lambda v: v.split(","), default=["none", "shared"])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Record Twitch responses once, then benchmark the full fetcher offline.
+
+"record" runs run_all against the real Twitch and saves the GraphQL answers
+and clip pages it got into a fixture file (gzipped JSON):
+
+    python benchmarks/fetcher_replay.py record clips.txt --fixtures twitch.json.gz
+
+"run" replays the same input through run_all, with every request going to
+a local stub (twitch_stub.py, in its own process so it doesn't count
+towards CPU time) that serves the fixtures with the given latency, error
+and 429 rates. Without --fixtures the stub makes clips up:
+
+    python benchmarks/fetcher_replay.py run clips.txt --fixtures twitch.json.gz \\
+        --latency 0.08 --error-rate 0.02 --throttle-rate 0.01 --set MAX_CONCURRENCY=40
+
+Each repeat prints one JSON line: wall and CPU time, peak memory, requests
+the stub saw, and how many clips were resolved. Without an input file the
+clips in clip_fetcher/clips.py are used.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import urlparse
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from clip_fetcher import fetcher  # noqa: E402
+from clip_fetcher.cli import load_categories  # noqa: E402
+from clip_fetcher.metrics import trace_config  # noqa: E402
+from clip_fetcher.scheduler import RequestSlots  # noqa: E402
+from twitch_stub import TwitchStub  # noqa: E402
+
+
+class Recorder:
+    # Captures what a real run sends and receives through aiohttp's tracing,
+    # so run_all itself runs unchanged. aiohttp traces no body chunks for
+    # streamed responses, so the clip pages the run asked for are fetched
+    # again in full afterwards (fetch_pages); a replay then stops reading
+    # them early just like a real run.
+
+    def __init__(self):
+        self._requests = []
+        self._pages = {}
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        async def start(session, ctx, params):
+            ctx.method, ctx.url, ctx.status = params.method, params.url, None
+            ctx.sent, ctx.received = bytearray(), bytearray()
+
+        async def chunk_sent(session, ctx, params):
+            ctx.sent += params.chunk
+
+        async def end(session, ctx, params):
+            ctx.status = params.response.status
+            self._requests.append(ctx)
+
+        async def chunk_received(session, ctx, params):
+            ctx.received += params.chunk
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(start)
+        config.on_request_chunk_sent.append(chunk_sent)
+        config.on_request_end.append(end)
+        config.on_response_chunk_received.append(chunk_received)
+        return config
+
+    async def fetch_pages(self):
+        urls = {str(r.url): r.status for r in self._requests if r.method == "GET"}
+        slots = RequestSlots(fetcher.MAX_CONCURRENCY, fetcher.PER_HOST_LIMIT)
+        async with fetcher.open_session() as session:
+            async def one(url):
+                body = (await fetcher.fetch_with_retries(session, "GET", url, slots=slots)
+                        if urls[url] == 200 else None)
+                self._pages[url] = body
+
+            await asyncio.gather(*(one(u) for u in urls))
+
+    def fixtures(self) -> dict:
+        # GraphQL answers per slug, so a replay may batch differently; pages
+        # per host and path. Throttled and failed responses are left out.
+        gql, pages = {}, {}
+        for r in self._requests:
+            if r.status == 429 or r.status >= 500:
+                continue
+            if r.method == "POST":
+                try:
+                    variables = json.loads(bytes(r.sent)).get("variables") or {}
+                    data = json.loads(bytes(r.received)).get("data") or {}
+                except ValueError:
+                    continue
+                for var, slug in variables.items():
+                    gql[slug] = data.get("c" + var[1:])
+            else:
+                body = self._pages.get(str(r.url))
+                pages[f"{r.url.host}{r.url.path_qs}"] = {"status": r.status if body is not None else 404,
+                                                         "body": body or ""}
+        return {"recorded_at": time.time(), "gql": gql, "pages": pages}
+
+
+class ReplaySession:
+    # Stands in for the ClientSession run_all opens: the same get()/post()
+    # calls, sent to the stub. The rate limiter and request slots still see
+    # Twitch's hosts, so per-host limits behave as they would for real.
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        # No per-host cap here: every URL has the stub's host, RequestSlots
+        # does the per-host limiting by the original one
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=fetcher.MAX_CONCURRENCY, limit_per_host=0),
+            trace_configs=[trace_config(fetcher.METRICS)],
+        )
+
+    def _url(self, url: str) -> str:
+        if url == fetcher.GQL_URL:
+            return f"{self.base_url}/gql"
+        parsed = urlparse(url)
+        query = f"?{parsed.query}" if parsed.query else ""
+        return f"{self.base_url}/replay/{parsed.netloc}{parsed.path}{query}"
+
+    def get(self, url, **kwargs):
+        return self._session.get(self._url(url), **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._session.post(self._url(url), **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+
+def load_fixtures(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def serve_stub(conn, stub_kwargs):
+    # Child process: run the stub until the parent says stop
+    async def serve():
+        async with TwitchStub(**stub_kwargs) as stub:
+            conn.send(stub.port)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, conn.recv)
+
+    asyncio.run(serve())
+
+
+async def stub_stats(session, base_url):
+    async with session.get(f"{base_url}/_stats") as resp:
+        return await resp.json()
+
+
+async def bench_once(categories, base_url, trace_memory):
+    fetcher.RATE_LIMITER.hosts.clear()
+    if trace_memory:
+        tracemalloc.start()
+    async with aiohttp.ClientSession() as control:
+        before = await stub_stats(control, base_url)
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        with tempfile.TemporaryDirectory() as out:
+            await fetcher.run_all(categories, None, output_dir=out,
+                                  session_factory=lambda: ReplaySession(base_url))
+            results = [json.loads(p.read_text(encoding="utf-8")) for p in Path(out).glob("clips_*.json")]
+        elapsed, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+        after = await stub_stats(control, base_url)
+    row = {
+        "clips": sum(len(r) for r in results),
+        "resolved": sum(1 for r in results for c in r if c["title"] and c["clip_creator"]),
+        "seconds": round(elapsed, 3),
+        "cpu_seconds": round(cpu, 3),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "requests": {k: after[k] - before[k] for k in after},
+    }
+    if trace_memory:
+        row["peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return row
+
+
+def run(args):
+    categories = load_categories(args.inputs)
+    fetcher.tune(**dict(knob.split("=", 1) for knob in args.set))
+    stub_kwargs = {"latency": args.latency, "rate_limit": args.rate_limit, "error_rate": args.error_rate,
+                   "throttle_rate": args.throttle_rate, "seed": args.seed,
+                   "fixtures": load_fixtures(args.fixtures) if args.fixtures else None}
+    parent, child = multiprocessing.Pipe()
+    stub = multiprocessing.Process(target=serve_stub, args=(child, stub_kwargs), daemon=True)
+    stub.start()
+    try:
+        base_url = f"http://127.0.0.1:{parent.recv()}"
+        for i in range(args.repeat):
+            row = asyncio.run(bench_once(categories, base_url, args.trace_memory))
+            print(json.dumps({"run": i, "knobs": args.set, **row}), flush=True)
+    finally:
+        parent.send("stop")
+        stub.join(5)
+
+
+def record(args):
+    categories = load_categories(args.inputs)
+    recorder = Recorder()
+
+    async def record_run():
+        await fetcher.run_all(
+            categories, None, output_dir=tempfile.mkdtemp(),
+            session_factory=lambda: fetcher.open_session(trace_configs=[recorder.trace_config()]))
+        await recorder.fetch_pages()
+
+    asyncio.run(record_run())
+    fixtures = recorder.fixtures()
+    with gzip.open(args.fixtures, "wt", encoding="utf-8") as f:
+        json.dump(fixtures, f)
+    print(f"Recorded {len(fixtures['gql'])} GraphQL clips and {len(fixtures['pages'])} pages to {args.fixtures}",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="fetch from Twitch and save the responses")
+    rec.add_argument("inputs", nargs="*", metavar="INPUT", help="URL list file, '-' for stdin")
+    rec.add_argument("--fixtures", required=True, help="fixture file to write (.json.gz)")
+    rec.set_defaults(func=record)
+
+    bench = commands.add_parser("run", help="run the fetcher against the local stub")
+    bench.add_argument("inputs", nargs="*", metavar="INPUT", help="URL list file, '-' for stdin")
+    bench.add_argument("--fixtures", help="recorded responses to serve (default: made-up clips)")
+    bench.add_argument("--latency", type=float, default=0.05, help="stub response time in seconds")
+    bench.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    bench.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    bench.add_argument("--rate-limit", type=float, help="requests per second before the stub sends 429s")
+    bench.add_argument("--seed", type=int, default=0, help="seed for the injected faults")
+    bench.add_argument("--set", action="append", default=[], metavar="KNOB=VALUE",
+                       help=f"override a fetcher knob ({', '.join(fetcher.TUNABLE)})")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--trace-memory", action="store_true",
+                       help="also report peak Python allocations (tracemalloc; slows the run)")
+    bench.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
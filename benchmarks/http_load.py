@@ -0,0 +1,314 @@
+"""Latency and throughput of the voting routes under simulated voters.
+
+Starts the app on a temporary vote store and lets rounds of concurrent
+voters go through a whole voting session each: log in, open the home page,
+watch a few clips per category, open the ballot and vote, back to home.
+Every round prints one JSON line with requests per second and p50/p95/p99
+latency per route (login, home, watch_clip, vote, submit_vote):
+
+    python benchmarks/http_load.py --voters 10,50,200
+    python benchmarks/http_load.py --backend log --server gunicorn --workers 4 \\
+        --seed-voters 50000 --output log-4w.json --compare sqlite-4w.json
+
+--server werkzeug uses `flask run --with-threads`; --server gunicorn uses
+`gunicorn -w WORKERS -k WORKER_CLASS --threads THREADS`. --seed-voters
+fills votes.json with that many made-up voters first, which is what the log
+backend rewrites on every compaction. Once the server is stopped the vote
+store is reopened and every voter's votes are checked, so votes lost between
+workers show up as lost_votes.
+
+--output saves the rounds and settings as JSON. --compare reads such a file
+and exits with 1 if a route's p95 got more than --tolerance slower at the
+same voter count.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog import load_catalog  # noqa: E402
+from vote_store import open_store, write_votes_json  # noqa: E402
+
+ROUTES = ["login", "home", "watch_clip", "vote", "submit_vote"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_votes(path, catalog, voters):
+    rng = random.Random(0)
+    categories = [c for c in catalog.ordered if c.clips]
+    with open(path, "w", encoding="utf-8") as f:
+        write_votes_json(f, ((f"seed{i}", {c.id: rng.choice(c.clips).slug for c in categories})
+                             for i in range(voters)))
+
+
+def start_server(args, port, tmp):
+    env = dict(os.environ, CONFIG_PATH=args.config, VOTE_BACKEND=args.backend,
+               VOTES_PATH=str(Path(tmp) / "votes.json"), VOTES_LOG_PATH=str(Path(tmp) / "votes.log"),
+               VOTES_DB_PATH=str(Path(tmp) / "votes.db"), SECRET_KEY="http-load-benchmark")
+    if args.server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-k", args.worker_class,
+               "--threads", str(args.threads), "-b", f"127.0.0.1:{port}", "flask_app:app"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "flask_app", "run",
+               "--with-threads", "--port", str(port)]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(base_url, timeout=15):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            try:
+                async with http.get(f"{base_url}/") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up")
+
+
+def percentile(sorted_values, p):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class RouteStats:
+    __slots__ = ("latencies", "errors")
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def summary(self, seconds):
+        latencies = sorted(self.latencies)
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "requests": len(latencies) + self.errors,
+            "errors": self.errors,
+            "rps": round(len(latencies) / seconds, 1) if seconds else None,
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p95_ms": ms(percentile(latencies, 95)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+        }
+
+
+class Voter:
+    # One browser: its own cookie jar, redirects not followed so each
+    # request is timed against the route that answered it
+
+    def __init__(self, connector, base_url, name, stats, think):
+        # unsafe=True: the default jar ignores cookies set by bare IP hosts
+        self.http = aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                          cookie_jar=aiohttp.CookieJar(unsafe=True))
+        self.base_url = base_url
+        self.name = name
+        self.stats = stats
+        self.think = think
+
+    async def request(self, route, method, path, **kwargs):
+        stats = self.stats[route]
+        t0 = time.perf_counter()
+        try:
+            async with self.http.request(method, self.base_url + path, allow_redirects=False, **kwargs) as resp:
+                await resp.read()
+                ok = resp.status in (200, 302)
+        except aiohttp.ClientError:
+            ok = False
+        if ok:
+            stats.latencies.append(time.perf_counter() - t0)
+        else:
+            stats.errors += 1
+        if self.think:
+            await asyncio.sleep(random.uniform(0, 2 * self.think))
+
+    async def session(self, categories, clips_per_category, rng):
+        try:
+            await self.request("login", "GET", "/")
+            await self.request("login", "POST", "/", data={"twitch_name": self.name})
+            await self.request("home", "GET", "/home")
+            for category in categories:
+                for clip in category.clips[:clips_per_category]:
+                    await self.request("watch_clip", "GET", f"/watch/{category.id}/{clip.index}")
+                await self.request("vote", "GET", f"/vote/{category.id}")
+                await self.request("submit_vote", "POST", "/vote",
+                                   data={"category_id": category.id, "vote": rng.choice(category.clips).slug})
+                await self.request("home", "GET", "/home")
+        finally:
+            await self.http.close()
+
+
+async def run_round(base_url, round_no, voters, categories, args):
+    stats = {route: RouteStats() for route in ROUTES}
+    rng = random.Random(round_no)
+    connector = aiohttp.TCPConnector(limit=0)
+    try:
+        sessions = [Voter(connector, base_url, f"load{round_no}_{i}", stats, args.think)
+                    for i in range(voters)]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(v.session(categories, args.clips_per_category, rng) for v in sessions))
+        elapsed = time.perf_counter() - t0
+    finally:
+        await connector.close()
+    completed = sum(len(s.latencies) for s in stats.values())
+    return {
+        "voters": voters,
+        "seconds": round(elapsed, 3),
+        "requests": completed + sum(s.errors for s in stats.values()),
+        "errors": sum(s.errors for s in stats.values()),
+        "rps": round(completed / elapsed, 1),
+        "voters_per_second": round(voters / elapsed, 1),
+        "routes": {route: s.summary(elapsed) for route, s in stats.items()},
+    }
+
+
+def count_lost_votes(args, tmp, rounds, categories):
+    # Reopen the store the server wrote and check each load-test voter's ballot
+    store = open_store(args.backend, Path(tmp) / "votes.json", db_path=Path(tmp) / "votes.db",
+                       log_path=Path(tmp) / "votes.log")
+    try:
+        all_votes = store.get_all_votes()
+    finally:
+        store.close()
+    lost = 0
+    for round_no, row in enumerate(rounds):
+        for i in range(row["voters"]):
+            user_votes = all_votes.get(f"load{round_no}_{i}", {})
+            lost += sum(1 for c in categories if c.id not in user_votes)
+    return lost
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(rounds, baseline_path, tolerance):
+    # One line per (voters, route) present in both runs; True if nothing regressed
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {row["voters"]: row for row in json.load(f)["rounds"]}
+    ok = True
+    for row in rounds:
+        old = baseline.get(row["voters"])
+        if old is None:
+            continue
+        for route, new_stats in row["routes"].items():
+            old_p95 = old["routes"].get(route, {}).get("p95_ms")
+            new_p95 = new_stats["p95_ms"]
+            if not old_p95 or new_p95 is None:
+                continue
+            change = new_p95 / old_p95 - 1
+            regressed = change > tolerance
+            ok = ok and not regressed
+            print(f"voters={row['voters']:<5} {route:<12} p95 {old_p95:>8.1f} -> {new_p95:>8.1f} ms "
+                  f"({change:+.0%}){'  REGRESSION' if regressed else ''}", file=sys.stderr)
+    return ok
+
+
+async def main_async(args, categories):
+    base_url = args.url.rstrip("/")
+    await wait_ready(base_url)
+    rounds = []
+    for round_no, voters in enumerate(args.voters):
+        row = await run_round(base_url, round_no, voters, categories, args)
+        print(json.dumps(row), flush=True)
+        rounds.append(row)
+    return rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--server", choices=["werkzeug", "gunicorn"], default="werkzeug")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument("--worker-class", default="gthread", help="gunicorn worker class (sync, gthread, gevent)")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument("--backend", choices=["sqlite", "log"], default="sqlite", help="VOTE_BACKEND of the server")
+    parser.add_argument("--seed-voters", type=int, default=0, help="voters already in votes.json")
+    parser.add_argument("--config", default=str(ROOT / "config.toml"))
+    parser.add_argument("--voters", type=lambda v: [int(x) for x in v.split(",")], default=[10, 50, 200],
+                        help="concurrent voters per round, comma separated")
+    parser.add_argument("--clips-per-category", type=int, default=3, help="watch pages opened per category")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between requests in seconds")
+    parser.add_argument("--output", help="save the run as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier --output file to compare p95s against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown for --compare")
+    args = parser.parse_args()
+    if args.server == "werkzeug" and args.workers != 1:
+        parser.error("--workers needs --server gunicorn")
+
+    categories = [c for c in load_catalog(args.config).ordered if c.clips]
+    with tempfile.TemporaryDirectory() as tmp:
+        lost_votes = None
+        server = None
+        if not args.url:
+            if args.seed_voters:
+                seed_votes(Path(tmp) / "votes.json", load_catalog(args.config), args.seed_voters)
+            port = free_port()
+            server = start_server(args, port, tmp)
+            args.url = f"http://127.0.0.1:{port}"
+        try:
+            rounds = asyncio.run(main_async(args, categories))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+        if server:
+            lost_votes = count_lost_votes(args, tmp, rounds, categories)
+
+    run = {
+        "settings": {
+            "server": "external" if server is None else args.server,
+            "workers": args.workers,
+            "worker_class": args.worker_class if args.server == "gunicorn" else None,
+            "threads": args.threads if args.server == "gunicorn" else None,
+            "backend": args.backend,
+            "seed_voters": args.seed_voters,
+            "clips_per_category": args.clips_per_category,
+            "think": args.think,
+            "categories": len(categories),
+        },
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "recorded_at": time.time(),
+        "lost_votes": lost_votes,
+        "rounds": rounds,
+    }
+    print(json.dumps({"lost_votes": lost_votes, "expected_votes": sum(r["voters"] for r in rounds) * len(categories)}))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    ok = compare(rounds, args.compare, args.tolerance) if args.compare else True
+    sys.exit(0 if ok and not lost_votes else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Clip page metadata extraction: BeautifulSoup vs. the streaming scanner.
+
+Runs both parsers over saved clip pages and reports time per page and peak
+traced memory. Use real pages saved from Twitch with --fixtures DIR (*.html);
+without it, pages generated by twitch_stub.clip_page are used:
+
+    python benchmarks/parse_clip_page.py --fixtures ~/clip_pages
+
+"soup" is the old full parse, "scanner" parses the whole page with
+ClipPageScanner, "scanner-stream" feeds 16 KB chunks and stops when done
+(what fetch_with_retries does).
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from clip_fetcher.fetcher import clip_info_from_scanner, parse_clip_page, parse_clip_page_soup  # noqa: E402
+from clip_fetcher.page_meta import ClipPageScanner  # noqa: E402
+from twitch_stub import clip_page  # noqa: E402
+
+CHUNK = 16 * 1024
+
+
+def scan_stream(page):
+    data = page.encode("utf-8")
+    scanner = ClipPageScanner()
+    for i in range(0, len(data), CHUNK):
+        if scanner.feed(data[i:i + CHUNK]):
+            break
+    return clip_info_from_scanner(scanner)
+
+
+PARSERS = {
+    "soup": parse_clip_page_soup,
+    "scanner": parse_clip_page,
+    "scanner-stream": scan_stream,
+}
+
+
+def load_fixtures(directory, count):
+    if directory:
+        return [p.read_text(encoding="utf-8", errors="replace") for p in sorted(Path(directory).glob("*.html"))]
+    return [clip_page(f"BenchSlug{i}-abcdefgh") for i in range(count)]
+
+
+def measure(parse, pages, repeat):
+    times = []
+    for _ in range(repeat):
+        for page in pages:
+            t0 = time.perf_counter()
+            parse(page)
+            times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    for page in pages:
+        parse(page)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "ms_per_page": round(statistics.median(times) * 1000, 3),
+        "peak_kb": peak // 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="directory of saved clip pages (*.html)")
+    parser.add_argument("--pages", type=int, default=20, help="generated pages when no --fixtures")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures, args.pages)
+    print(f"{len(pages)} pages, {sum(map(len, pages)) // len(pages) // 1024} KB on average")
+    mismatches = sum(1 for page in pages if parse_clip_page(page) != parse_clip_page_soup(page))
+    print(f"results differing from soup: {mismatches}")
+    for name, parse in PARSERS.items():
+        print(json.dumps({"parser": name, **measure(parse, pages, args.repeat)}))
+
+
+if __name__ == "__main__":
+    main()
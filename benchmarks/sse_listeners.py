@@ -0,0 +1,183 @@
+"""How many live-results listeners can one worker process serve?
+
+Starts the app in a single process (or uses --url), connects N listeners to
+/api/results/stream, then casts bursts of votes and measures how long each
+batched delta takes to reach every listener:
+
+    python benchmarks/sse_listeners.py --listeners 50,200,1000
+    python benchmarks/sse_listeners.py --server gevent --listeners 1000,5000
+
+--server werkzeug uses `flask run --with-threads` (one OS thread per listener),
+--server gevent uses `gunicorn -k gevent -w 1` (one greenlet per listener).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, tmp):
+    env = dict(os.environ, VOTES_DB_PATH=str(Path(tmp) / "votes.db"),
+               VOTES_PATH=str(Path(tmp) / "votes.json"))
+    if kind == "gevent":
+        cmd = [sys.executable, "-m", "gunicorn", "-k", "gevent", "-w", "1",
+               "--worker-connections", "20000", "-b", f"127.0.0.1:{port}", "flask_app:app"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "flask_app", "run",
+               "--with-threads", "--port", str(port)]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(base_url, timeout=15):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            try:
+                async with http.get(f"{base_url}/api/results") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up")
+
+
+class Listener:
+    def __init__(self):
+        self.connected = asyncio.Event()
+        self.deltas = []  # arrival times of delta events
+
+    async def run(self, http, url):
+        async with http.get(url) as resp:
+            event = None
+            async for raw in resp.content:
+                line = raw.decode().rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    if event == "snapshot":
+                        self.connected.set()
+                    elif event == "delta":
+                        self.deltas.append(time.perf_counter())
+
+
+async def post_expecting_redirect(http, url, data):
+    # Login and a stored vote both answer with a redirect; anything else means
+    # the vote was not counted and the round would measure nothing
+    async with http.post(url, data=data, allow_redirects=False) as resp:
+        if resp.status not in (302, 303):
+            raise RuntimeError(f"POST {url} {data} answered {resp.status}, expected a redirect")
+
+
+async def cast_votes(base_url, category_id, slugs, votes):
+    # unsafe=True: the default jar ignores cookies set by bare IP hosts
+    async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as http:
+        for i in range(votes):
+            await post_expecting_redirect(http, f"{base_url}/", {"twitch_name": f"bench_{time.time_ns()}_{i}"})
+            await post_expecting_redirect(http, f"{base_url}/vote",
+                                          {"category_id": category_id, "vote": slugs[i % len(slugs)]})
+
+
+async def run_round(base_url, category_id, slugs, listeners, bursts, burst_size):
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        clients = [Listener() for _ in range(listeners)]
+        tasks = [asyncio.create_task(c.run(http, f"{base_url}/api/results/stream")) for c in clients]
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(c.connected.wait() for c in clients)), 60)
+        except asyncio.TimeoutError:
+            pass
+        connect_time = time.perf_counter() - t0
+        connected = sum(c.connected.is_set() for c in clients)
+
+        # Latency is measured from the last vote of a burst to the delta that
+        # carries it; messages counts how many deltas the burst turned into
+        latencies = []
+        messages = []
+        for _ in range(bursts):
+            for c in clients:
+                c.deltas.clear()
+            await cast_votes(base_url, category_id, slugs, burst_size)
+            sent = time.perf_counter()
+            await asyncio.sleep(2)
+            for c in clients:
+                if c.deltas:
+                    latencies.append(max(c.deltas) - sent)
+                    messages.append(len(c.deltas))
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    return {
+        "listeners": listeners,
+        "connected": connected,
+        "connect_seconds": round(connect_time, 3),
+        "deliveries": len(latencies),
+        "expected_deliveries": connected * bursts,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+        "messages_per_burst": round(statistics.mean(messages), 1) if messages else None,
+    }
+
+
+async def main_async(args):
+    base_url = args.url.rstrip("/")
+    await wait_ready(base_url)
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"{base_url}/api/results") as resp:
+            # Votes are stored by clip slug, so take real ones from the results
+            category = next(c for c in (await resp.json())["categories"] if c["clips"])
+            category_id, slugs = category["id"], [clip["slug"] for clip in category["clips"]]
+    rows = []
+    for n in args.listeners:
+        row = await run_round(base_url, category_id, slugs, n, args.bursts, args.burst_size)
+        print(json.dumps(row))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--server", choices=["werkzeug", "gevent"], default="werkzeug")
+    parser.add_argument("--listeners", type=lambda v: [int(x) for x in v.split(",")], default=[50, 200, 500])
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--burst-size", type=int, default=20, help="votes cast back to back per burst")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if not args.url:
+            port = free_port()
+            server = start_server(args.server, port, tmp)
+            args.url = f"http://127.0.0.1:{port}"
+        try:
+            asyncio.run(main_async(args))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Local stand-in for Twitch's GraphQL endpoint and clip pages.
+
+Used by the clip_fetcher benchmarks so they measure the fetcher and not the
+network, and never hit Twitch's rate limits. Every clip slug resolves to
+deterministic metadata; slugs starting with "missing" resolve to null.
+With rate_limit set, requests beyond that many per second get a 429 with
+Retry-After, like Twitch does. error_rate and throttle_rate answer that
+share of requests with a 503 or a 429 at random.
+
+    async with TwitchStub(latency=0.05) as stub:
+        resolver = GqlClipResolver(session, url=stub.gql_url)
+
+With fixtures (recorded by fetcher_replay.py) the stub serves those instead
+of made-up clips. /replay/<host>/<path> serves the page recorded for
+https://<host>/<path>; /_stats returns the request counters.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+
+from aiohttp import web
+
+_ALIASED_RE = re.compile(r"(\w+)\s*:\s*clip\(slug:\s*\$(\w+)\)")
+_INLINE_RE = re.compile(r'clip\(slug:\s*"([^"]+)"\)')
+
+
+def clip_data(slug):
+    if slug.startswith("missing"):
+        return None
+    return {
+        "title": f"Clip {slug[:12]}",
+        "durationSeconds": 5 + len(slug) % 55,
+        "thumbnailURL": f"https://clips-media-assets2.twitch.tv/{slug}-preview-480x272.jpg",
+        "curator": {"displayName": f"Curator{len(slug) % 7}", "login": f"curator{len(slug) % 7}"},
+        "broadcaster": {"displayName": "cherryylein", "login": "cherryylein"},
+    }
+
+
+def clip_page(slug):
+    # Shaped like a real clip page: metadata in a small <head>, followed by a
+    # few hundred KB of inline script
+    clip = clip_data(slug)
+    scripts = "".join(
+        f'<script>window.__chunk{i}=function(a,b){{return "{slug}"+a*b+{"x" * 40!r}.length}};'
+        f'{"var q=[1,2,3].map(function(n){return n*2});" * 250}</script>'
+        for i in range(30)
+    )
+    if clip is None:
+        return f"<html><head><title>Twitch</title></head><body>{scripts}</body></html>"
+    title = f"cherryylein - {clip['title']} - Clip Created by @{clip['curator']['login']}"
+    ld_json = json.dumps({"@context": "http://schema.org", "@type": "VideoObject", "name": clip["title"],
+                          "creator": {"@type": "Person", "name": clip["curator"]["displayName"]}})
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">'
+        '<meta property="og:site_name" content="Twitch">'
+        f'<meta property="og:title" content="{title}">'
+        f'<meta property="og:description" content="Watch {clip["title"]} on Twitch">'
+        f'<meta name="twitter:title" content="{title}">'
+        f'<title>{title}</title>'
+        f'<script type="application/ld+json">{ld_json}</script>'
+        f'</head><body><div id="root"></div>{scripts}'
+        f'<script>window.__INITIAL_STATE__={{"clip":{{"curator":{{"displayName":"{clip["curator"]["displayName"]}"}}}}}}'
+        '</script></body></html>'
+    )
+
+
+class TwitchStub:
+    def __init__(self, latency=0.05, host="127.0.0.1", rate_limit=None, retry_after=1,
+                 fixtures=None, error_rate=0.0, throttle_rate=0.0, seed=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.fixtures = fixtures
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self.errors = 0
+        self._tokens = rate_limit or 0
+        self._refilled = time.monotonic()
+        self.throttled = 0
+        self.host = host
+        self.port = None
+        self.gql_requests = 0
+        self.page_requests = 0
+        self.clips_requested = 0
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def gql_url(self):
+        return f"{self.base_url}/gql"
+
+    def reset(self):
+        self.gql_requests = self.page_requests = self.clips_requested = self.throttled = self.errors = 0
+
+    def stats(self):
+        return {"gql_requests": self.gql_requests, "page_requests": self.page_requests,
+                "clips_requested": self.clips_requested, "throttled": self.throttled, "errors": self.errors}
+
+    def _over_limit(self):
+        # Token bucket holding one second's worth of requests
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            self.throttled += 1
+            return True
+        self._tokens -= 1
+        return False
+
+    def _throttled_response(self):
+        return web.Response(status=429, text="Too Many Requests",
+                            headers={"Retry-After": str(self.retry_after)})
+
+    def _injected_fault(self):
+        # Rate limiting first, then the random 429s and 503s
+        if self._over_limit():
+            return self._throttled_response()
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.throttled += 1
+            return self._throttled_response()
+        if roll < self.throttle_rate + self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text="Service Unavailable")
+        return None
+
+    def _clip(self, slug):
+        if self.fixtures is not None:
+            return self.fixtures["gql"].get(slug)
+        return clip_data(slug)
+
+    async def _gql(self, request):
+        self.gql_requests += 1
+        fault = self._injected_fault()
+        if fault is not None:
+            return fault
+        body = await request.json()
+        query = body.get("query", "")
+        variables = body.get("variables") or {}
+        await asyncio.sleep(self.latency)
+        data = {}
+        for alias, var in _ALIASED_RE.findall(query):
+            data[alias] = self._clip(variables.get(var, ""))
+        inline = _INLINE_RE.search(query)
+        if inline:
+            data["clip"] = self._clip(inline.group(1))
+        self.clips_requested += len(data)
+        return web.json_response({"data": data})
+
+    async def _page(self, request):
+        self.page_requests += 1
+        fault = self._injected_fault()
+        if fault is not None:
+            return fault
+        await asyncio.sleep(self.latency)
+        return web.Response(text=clip_page(request.match_info["slug"]), content_type="text/html")
+
+    async def _replay(self, request):
+        self.page_requests += 1
+        fault = self._injected_fault()
+        if fault is not None:
+            return fault
+        await asyncio.sleep(self.latency)
+        if self.fixtures is None:
+            slug = request.match_info["path"].rstrip("/").rsplit("/", 1)[-1]
+            return web.Response(text=clip_page(slug), content_type="text/html")
+        query = f"?{request.query_string}" if request.query_string else ""
+        page = self.fixtures["pages"].get(f'{request.match_info["host"]}/{request.match_info["path"]}{query}')
+        if page is None:
+            return web.Response(status=404, text="Not Found")
+        return web.Response(status=page["status"], text=page["body"], content_type="text/html")
+
+    async def _stats(self, request):
+        return web.json_response(self.stats())
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/gql", self._gql)
+        app.router.add_get("/_stats", self._stats)
+        app.router.add_get("/replay/{host}/{path:.*}", self._replay)
+        app.router.add_get("/{broadcaster}/clip/{slug}", self._page)
+        app.router.add_get("/{slug}", self._page)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
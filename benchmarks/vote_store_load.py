@@ -0,0 +1,99 @@
+"""Concurrent vote load test for the vote store backends.
+
+Several processes hammer one store at the same time, each casting votes for
+its own set of voters (and changing a share of them afterwards). At the end
+the store is reopened, every voter's last vote must be present and the
+per-clip tallies must match a full recount:
+
+    python benchmarks/vote_store_load.py --processes 8 --votes 2000
+    python benchmarks/vote_store_load.py --backend log   # shows lost votes
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vote_store import open_store  # noqa: E402
+
+CATEGORIES = ["funniest_moment", "rage_moment", "jumpscare", "gaming_moment"]
+
+
+def expected_vote(worker, i):
+    # The final clip every (voter, category) pair should end up with
+    return f"clip{(worker + i) % 7}"
+
+
+def worker_main(backend, votes_path, worker, votes, start):
+    store = open_store(backend, votes_path)
+    start.wait()
+    for i in range(votes):
+        voter = f"w{worker}_voter{i // len(CATEGORIES)}"
+        category_id = CATEGORIES[i % len(CATEGORIES)]
+        # Cast a provisional vote for every other pair first, then overwrite it,
+        # so upsert ordering within one voter is exercised too
+        if i % 2:
+            store.record_vote(voter, category_id, "clip99")
+        store.record_vote(voter, category_id, expected_vote(worker, i))
+        if i % 50 == 0:
+            store.get_user_votes(voter)
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "log"], default="sqlite")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--votes", type=int, default=1000, help="final votes per process")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        votes_path = Path(tmp) / "votes.json"
+        open_store(args.backend, votes_path).close()
+
+        start = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=worker_main,
+                                         args=(args.backend, votes_path, w, args.votes, start))
+                 for w in range(args.processes)]
+        for p in procs:
+            p.start()
+        t0 = time.perf_counter()
+        start.set()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - t0
+
+        failed = [p for p in procs if p.exitcode != 0]
+        store = open_store(args.backend, votes_path)
+        all_votes = store.get_all_votes()
+        tallies = store.get_tallies()
+
+    lost = 0
+    for w in range(args.processes):
+        for i in range(args.votes):
+            voter = f"w{w}_voter{i // len(CATEGORIES)}"
+            category_id = CATEGORIES[i % len(CATEGORIES)]
+            if all_votes.get(voter, {}).get(category_id) != expected_vote(w, i):
+                lost += 1
+
+    # The incrementally maintained tallies must match a full recount
+    recount = {}
+    for user_votes in all_votes.values():
+        for category_id, clip_id in user_votes.items():
+            counts = recount.setdefault(category_id, {})
+            counts[clip_id] = counts.get(clip_id, 0) + 1
+    tallies_ok = tallies == recount
+
+    writes = args.processes * (args.votes + args.votes // 2)
+    print(f"backend={args.backend} processes={args.processes} writes={writes}")
+    print(f"elapsed={elapsed:.2f}s throughput={writes / elapsed:.0f} writes/s")
+    print(f"expected={args.processes * args.votes} lost_or_wrong={lost} crashed_workers={len(failed)}")
+    print(f"tallies_match_recount={tallies_ok}")
+    sys.exit(1 if lost or failed or not tallies_ok else 0)
+
+
+if __name__ == "__main__":
+    main()
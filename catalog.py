@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+
+from clip_fetcher.slugs import get_clip_id
+from clip_fetcher.sync_config import parse_toml
+
+
+class Clip:
+    __slots__ = ("index", "slug", "url", "title", "creator", "thumbnail", "duration", "duration_label",
+                 "page_url", "embed_prefix", "previous_index", "next_index")
+
+    def __init__(self, index, url, title, creator, previous_index, next_index, thumbnail=None, duration=None):
+        self.index = index
+        # Twitch clip slug: the stable identity votes are stored under
+        self.slug = get_clip_id(url) or url
+        self.url = url
+        self.title = title
+        self.creator = creator
+        # Shown instead of the player until the viewer clicks play; both come
+        # from `clip-fetcher --update-config` and may be missing
+        self.thumbnail = thumbnail or None
+        self.duration = duration
+        self.duration_label = f"{int(duration) // 60}:{int(duration) % 60:02d}" if duration else None
+        # Where the facade links to when JavaScript is off
+        self.page_url = f"https://clips.twitch.tv/{self.slug}"
+        self.previous_index = previous_index
+        self.next_index = next_index
+        # Everything but the parent domain, which depends on the request host
+        separator = "&" if "?" in url else "?"
+        self.embed_prefix = f"{url}{separator}parent="
+
+    def embed_url(self, parent_domain):
+        return self.embed_prefix + parent_domain
+
+
+class Category:
+    __slots__ = ("id", "name", "position", "clips", "by_slug")
+
+    def __init__(self, category_id, name, position, clips):
+        self.id = category_id
+        self.name = name
+        self.position = position
+        self.clips = clips
+        self.by_slug = {}
+        for clip in clips:
+            self.by_slug.setdefault(clip.slug, clip)
+
+    def get_clip(self, clip_index):
+        if 0 <= clip_index < len(self.clips):
+            return self.clips[clip_index]
+        return None
+
+    def get_clip_by_slug(self, slug):
+        return self.by_slug.get(slug)
+
+
+class Catalog:
+    # Immutable, pre-indexed view of config.toml's categories. Built once per
+    # version of the file and only read by the request handlers.
+
+    def __init__(self, categories, version=""):
+        self.categories = {c.id: c for c in categories}
+        self.ordered = tuple(categories)
+        # Content hash of config.toml; the same in every worker process
+        self.version = version
+
+    def get_category(self, category_id):
+        return self.categories.get(category_id)
+
+    def get_clip(self, category_id, clip_index):
+        category = self.categories.get(category_id)
+        if category is None:
+            return None, None
+        return category, category.get_clip(clip_index)
+
+    def split_by_votes(self, user_votes):
+        # (voted, todo) categories in catalog order, in one pass
+        voted, todo = [], []
+        for category in self.ordered:
+            (voted if category.id in user_votes else todo).append(category)
+        return voted, todo
+
+
+def build_catalog(config, version=""):
+    categories = []
+    for position, (category_id, raw) in enumerate(config.get("categories", {}).items()):
+        raw_clips = raw.get("clips", [])
+        last = len(raw_clips) - 1
+        clips = tuple(
+            Clip(
+                index=i,
+                url=c["url"],
+                title=c.get("title"),
+                creator=c.get("creator"),
+                thumbnail=c.get("thumbnail"),
+                duration=c.get("duration"),
+                previous_index=i - 1 if i > 0 else None,
+                next_index=i + 1 if i < last else None,
+            )
+            for i, c in enumerate(raw_clips)
+        )
+        categories.append(Category(category_id, raw.get("name", category_id), position, clips))
+    return Catalog(categories, version)
+
+
+def load_catalog(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return build_catalog(parse_toml(data.decode("utf-8")), hashlib.sha1(data).hexdigest()[:12])
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+class CatalogSource:
+    # Serves the current Catalog for config.toml and rebuilds it when the file
+    # changes. get() costs one stat(); a changed mtime, inode (editors that
+    # save via rename) or size triggers a reparse, and the new catalog replaces
+    # the old one with a single reference assignment, so a request never sees
+    # a half-built catalog.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = _file_signature(path)
+        self.catalog = load_catalog(path)
+
+    def get(self):
+        try:
+            signature = _file_signature(self.path)
+        except OSError:
+            return self.catalog
+        if signature != self._signature:
+            self._reload(signature)
+        return self.catalog
+
+    def _reload(self, signature):
+        with self._lock:
+            if signature == self._signature:
+                return  # another thread got here first
+            self._signature = signature
+            try:
+                catalog = load_catalog(self.path)
+            except Exception as e:
+                # Most likely caught mid-save; keep serving the old catalog and
+                # try again on the next change
+                print(f"Could not reload {self.path}: {e}")
+                return
+            if catalog.version == self.catalog.version:
+                return
+            self.catalog = catalog
+            print(f"Reloaded {self.path} (version {catalog.version})")
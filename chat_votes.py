@@ -0,0 +1,68 @@
+import re
+
+from vote_store import normalize_name
+
+# Chat lines that carry a vote, in the formats chat exports come in:
+#   @badge-info=...;display-name=Ente_VVS :ente_vvs!ente_vvs@ente_vvs.tmi.twitch.tv PRIVMSG #cherryylein :!vote rage_moment 3
+#   [2025-01-04 21:13:07] ente_vvs: !vote rage_moment 3
+#   [21:13:07] <ente_vvs> !vote rage_moment 3
+_IRC_RE  = re.compile(r"^(?:@\S* )?:(\w+)!\S* PRIVMSG #\w+ :(.*)$")
+_LOG_RE  = re.compile(r"^(?:\[[^\]]*\]\s*)?[@+%~&]?(\w+): (.*)$")
+_NICK_RE = re.compile(r"^(?:\[[^\]]*\]\s*)?<[@+%~&]?(\w+)> (.*)$")
+_LINE_PATTERNS = (_IRC_RE, _LOG_RE, _NICK_RE)
+# "!vote <category id> <clip number>"; clips are numbered from 1 like on the watch page
+_VOTE_RE = re.compile(r"^\s*!vote\s+(\S+)\s+#?(\d+)\b", re.I)
+# Cheap test that skips the line regexes for the vast majority of chat lines
+_MARKER_RE = re.compile(r"!vote", re.I)
+
+
+class ChatVoteStats:
+    __slots__ = ("lines", "votes", "unknown_category", "unknown_clip")
+
+    def __init__(self):
+        self.lines = 0
+        self.votes = 0              # valid !vote messages, before last-vote-wins
+        self.unknown_category = 0
+        self.unknown_clip = 0
+
+
+def parse_chat_line(line):
+    # (twitch name, category, clip number) for a !vote message, else None
+    for pattern in _LINE_PATTERNS:
+        m = pattern.match(line)
+        if m:
+            vote = _VOTE_RE.match(m.group(2))
+            if vote:
+                return normalize_name(m.group(1)), vote.group(1), int(vote.group(2))
+            return None
+    return None
+
+
+def collect_chat_votes(lines, catalog, votes=None, stats=None):
+    # Fold !vote messages into {twitch_name: {category_id: clip slug}}, the
+    # last vote per (voter, category) winning. Lines are consumed one at a
+    # time, so memory grows with the number of voters, not with the log.
+    # Category ids are matched case-insensitively against config.toml;
+    # votes for unknown categories or clip numbers are counted and dropped.
+    votes = {} if votes is None else votes
+    stats = ChatVoteStats() if stats is None else stats
+    categories = {c.id.lower(): c for c in catalog.ordered}
+    for line in lines:
+        stats.lines += 1
+        if not _MARKER_RE.search(line):
+            continue
+        parsed = parse_chat_line(line.rstrip("\r\n"))
+        if parsed is None:
+            continue
+        twitch_name, category_key, number = parsed
+        category = categories.get(category_key.lower())
+        if category is None:
+            stats.unknown_category += 1
+            continue
+        clip = category.get_clip(number - 1) if number > 0 else None
+        if clip is None:
+            stats.unknown_clip += 1
+            continue
+        stats.votes += 1
+        votes.setdefault(twitch_name, {})[category.id] = clip.slug
+    return votes, stats
@@ -0,0 +1,10 @@
+"""Look up title and creator of Twitch clips.
+
+    from clip_fetcher import resolve_clips
+    infos = resolve_clips(["https://clips.twitch.tv/SomeClipSlug"])
+
+Importing the package is cheap; aiohttp is loaded on the first lookup.
+"""
+from .resolve import ClipInfo, resolve_clips
+
+__all__ = ["ClipInfo", "resolve_clips"]
@@ -0,0 +1,56 @@
+import json
+import os
+from typing import Dict, Optional
+
+# Default checkpoint file name, inside the output directory
+CHECKPOINT_NAME = "clips_checkpoint.jsonl"
+
+
+class Checkpoint:
+    # Every finished clip lookup as one JSON line, flushed right away, so an
+    # interrupted run loses at most the clips that were still in flight.
+    # The per-category files are built from here, not from memory.
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        # Without resume an old checkpoint belongs to another run: start over
+        self._f = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._f.tell() and not self._ends_with_newline():
+            # Finish a line cut short by a crash, so it doesn't swallow the next one
+            self._f.write("\n")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def record(self, slug: str, url: str, info: Dict[str, Optional[str]]):
+        line = {"slug": slug, "url": url, "title": info.get("title"), "creator": info.get("creator"),
+                "broadcaster": info.get("broadcaster"), "thumbnail": info.get("thumbnail"),
+                "duration": info.get("duration")}
+        self._f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def load(self) -> Dict[str, Dict[str, Optional[str]]]:
+        # slug -> info, the last line per slug winning. A line cut short by
+        # a crash is skipped.
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["slug"]] = {"title": entry.get("title"), "creator": entry.get("creator"),
+                                          "broadcaster": entry.get("broadcaster"),
+                                          "thumbnail": entry.get("thumbnail"), "duration": entry.get("duration")}
+        return entries
+
+    def resolved(self) -> Dict[str, Dict[str, Optional[str]]]:
+        # What --resume skips; clips that came back empty are tried again
+        return {slug: info for slug, info in self.load().items() if info["title"] or info["creator"]}
+
+    def close(self):
+        self._f.close()
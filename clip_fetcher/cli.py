@@ -0,0 +1,98 @@
+import argparse
+import sys
+from typing import Dict, List
+
+from .checkpoint import Checkpoint
+from .inputs import merge_url_lists, read_url_list
+from .metadata_cache import CACHE_PATH, DEFAULT_MAX_AGE, MetadataCache
+from .sync_config import config_categories
+
+# The fetcher (aiohttp and friends) is imported only once there is work to
+# do, so --help and bad arguments come back immediately
+
+
+def load_categories(inputs: List[str]) -> Dict[str, List[str]]:
+    if not inputs:
+        from .clips import CLIP_CATEGORIES
+        return CLIP_CATEGORIES
+    lists = []
+    for path in inputs:
+        if path == "-":
+            lists.append(read_url_list(sys.stdin))
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                lists.append(read_url_list(f))
+    return merge_url_lists(lists)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="clip-fetcher",
+        description="Fetch title and creator for Twitch clips.",
+        epilog="Input files list one clip URL per line; a '[Category]' line starts a category and "
+               "'#' starts a comment. A JSON object of category -> URLs works too.",
+    )
+    parser.add_argument("inputs", nargs="*", metavar="INPUT",
+                        help="URL list file, '-' for stdin (default: CLIP_CATEGORIES in clip_fetcher/clips.py; "
+                             "with --update-config, the clips already in that config)")
+    parser.add_argument("--output-dir", default=".",
+                        help="directory for the clips_<category>.json files (default: %(default)s)")
+    parser.add_argument("--json", action="store_true",
+                        help="print all results as one JSON object instead of writing files")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="record each resolved clip here as it completes "
+                             "(default: clips_checkpoint.jsonl in the output directory; with --json, a temporary file)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip clips the checkpoint already has a title or creator for")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write request timings, retries and resolution strategies as JSON")
+    parser.add_argument("--cache", default=str(CACHE_PATH), help="metadata cache file (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the cache")
+    parser.add_argument("--refresh", action="store_true", help="refetch every clip, then update the cache")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE / 86400,
+                        help="days a cached entry stays fresh (default: %(default)s)")
+    parser.add_argument("--update-config", metavar="CONFIG",
+                        help="only resolve clips missing from this config.toml, or missing title, creator or "
+                             "thumbnail there, and merge them into it")
+    parser.add_argument("--output", help="with --update-config: write the merged config here instead")
+    parser.add_argument("--dry-run", action="store_true", help="with --update-config: don't write anything")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.update_config and not args.inputs:
+            # Backfill everything the config lists, in every category
+            with open(args.update_config, "r", encoding="utf-8") as f:
+                categories = config_categories(f.read())
+        else:
+            categories = load_categories(args.inputs)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not any(categories.values()):
+        parser.error("no clip URLs given")
+
+    import asyncio
+    from .fetcher import run_all, update_config
+
+    cache = None
+    if not args.no_cache:
+        # --refresh is max-age 0: every entry is stale, results are still stored
+        cache = MetadataCache(args.cache, max_age=0 if args.refresh else args.max_age * 86400)
+    try:
+        if args.update_config:
+            asyncio.run(update_config(categories, args.update_config, args.output, cache,
+                                      dry_run=args.dry_run, report=args.report))
+        else:
+            checkpoint = Checkpoint(args.checkpoint, resume=args.resume) if args.checkpoint else None
+            try:
+                asyncio.run(run_all(categories, cache, output_dir=args.output_dir, as_json=args.json,
+                                    report=args.report, checkpoint=checkpoint, resume=args.resume))
+            finally:
+                if checkpoint is not None:
+                    checkpoint.close()
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
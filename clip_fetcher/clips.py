@@ -286,7 +286,7 @@ CLIP_CATEGORIES = {
     "Lost_Moment": [
         "https://www.twitch.tv/cherryylein/clip/ObeseClearCatKappaClaus-ytMLXgEAG4O_FvS_",
         "https://www.twitch.tv/cherryylein/clip/AbrasiveKnottyPigResidentSleeper-qA186S8YDE4W06y8",
-        "https://www.twitch.tv/cherryylein/clip/PopularConsiderateDuckDAESuppy-akLc3AvWY8aD3PDy"
+        "https://www.twitch.tv/cherryylein/clip/PopularConsiderateDuckDAESuppy-akLc3AvWY8aD3PDy",
         "https://www.twitch.tv/cherryylein/clip/ResourcefulCoyEaglePJSugar-wJuvYev7cdF-cO3m",
         "https://www.twitch.tv/cherryylein/clip/ReliableAthleticTardigradeAMPEnergy-d6X5U4bqOxoHhAcP",
     ]
@@ -4,25 +4,53 @@ import random
 import html
 import re
 import json
-from urllib.parse import urlparse, parse_qs
-from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
-
-from clips import CLIP_CATEGORIES
-
-# ============================================
-# Keep your original CLIP_CATEGORIES as-is
-# (paste your big dict here)
-# ============================================
-# CLIP_CATEGORIES = { ... }  # <- unchanged
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .checkpoint import CHECKPOINT_NAME, Checkpoint
+from .metadata_cache import MetadataCache
+from .metrics import RunMetrics, trace_config
+from .page_meta import CREATOR_PATTERNS, ClipPageScanner, split_og_title
+from .rate_limit import CircuitOpenError, HostRateLimiter, parse_retry_after
+from .scheduler import PROGRESS_INTERVAL, RequestSlots, WorkQueue
+from .slugs import get_clip_id
+from .sync_config import EMBED_URL, apply_update, fill_in, plan_update, write_atomic
 
 # ---------- Tuning knobs ----------
-MAX_CONCURRENCY = 20
+MAX_CONCURRENCY = 20     # HTTP requests in flight
 PER_HOST_LIMIT   = 8
+CLIP_WORKERS     = 50     # clips being looked up at once; their GQL lookups share batches
 HTTP_TIMEOUT     = 15
 RETRIES          = 3
 BACKOFF          = 1.35
 RETRYABLE        = {429, 500, 502, 503, 504}
+MAX_BODY_BYTES   = 2 * 1024 * 1024   # clip metadata sits in the first few KB of a page
+STREAM_CHUNK     = 16 * 1024
+
+# Progress and summaries go to stderr; stdout is left for `clip-fetcher --json`
+log = partial(print, file=sys.stderr)
+
+# One limiter for the whole process: every coroutine talking to a host shares
+# its request rate, 429 back-off and circuit breaker (see rate_limit.py)
+RATE_LIMITER = HostRateLimiter()
+# Timings and counters for the run report (see metrics.py)
+METRICS = RunMetrics()
+
+TUNABLE = ("MAX_CONCURRENCY", "PER_HOST_LIMIT", "CLIP_WORKERS", "HTTP_TIMEOUT", "RETRIES", "BACKOFF",
+           "GQL_BATCH_SIZE", "GQL_BATCH_WINDOW")
+
+def tune(**knobs):
+    # Override tuning knobs for this process, e.g. tune(MAX_CONCURRENCY=40);
+    # used by benchmarks/fetcher_replay.py. Call it between runs, not during one.
+    for name, value in knobs.items():
+        if name not in TUNABLE:
+            raise ValueError(f"unknown knob {name!r}, expected one of {', '.join(TUNABLE)}")
+        globals()[name] = type(globals()[name])(value)
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -44,46 +72,28 @@ def clean_html_entities(text: Optional[str]) -> Optional[str]:
     text = re.sub(r'["\'/><]', '', text)
     return text.strip()
 
-def get_clip_id(url: str) -> str:
-    parsed = urlparse(url)
-    if parsed.netloc.endswith("clips.twitch.tv"):
-        slug = parsed.path.strip("/").split("/")[0]
-        return slug or ""
-    if parsed.netloc.endswith("twitch.tv"):
-        parts = [p for p in parsed.path.split("/") if p]
-        for i, p in enumerate(parts):
-            if p.lower() == "clip" and i + 1 < len(parts):
-                return parts[i + 1]
-        qs = parse_qs(parsed.query)
-        for k in ("clip", "slug", "id"):
-            if k in qs and qs[k]:
-                return qs[k][0]
-    m = re.search(r"(?:clip/|clips\.twitch\.tv/)([A-Za-z0-9_-]+)", url)
-    if m:
-        return m.group(1)
-    return ""
+def finish_clip_info(title: Optional[str], creator: Optional[str]) -> Dict[str, Optional[str]]:
+    if title:
+        title = clean_html_entities(title)
+        title = re.sub(r'\s*-\s*Twitch\s*Clips?\s*$', '', title, flags=re.IGNORECASE)
+        if title.strip() == "Twitch":
+            title = None
+    if creator:
+        creator = clean_html_entities(creator)
+        if creator and creator.startswith('@'):
+            creator = creator[1:]
+    return {"title": title, "creator": creator}
 
-def parse_clip_page(html_content: str) -> Dict[str, Optional[str]]:
+def parse_clip_page_soup(html_content: str) -> Dict[str, Optional[str]]:
+    # Full BeautifulSoup parse; slow, only for pages ClipPageScanner can't read
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_content, 'html.parser')
     title = None
     creator = None
 
     og = soup.find('meta', property='og:title')
     if og and og.get('content'):
-        t = og['content']
-        if " - Clip Created by @" in t:
-            parts = t.split(' - Clip Created by @')
-            if len(parts) == 2:
-                title_part = parts[0].strip()
-                creator = clean_html_entities(parts[1].strip())
-                if creator and creator.startswith('@'):
-                    creator = creator[1:]
-                if ' - ' in title_part:
-                    title = ' - '.join(title_part.split(' - ')[1:])
-                else:
-                    title = title_part
-        else:
-            title = t
+        title, creator = split_og_title(og['content'])
 
     if not (title and creator):
         for script in soup.find_all('script', type='application/ld+json'):
@@ -103,141 +113,270 @@ def parse_clip_page(html_content: str) -> Dict[str, Optional[str]]:
 
     if not creator:
         for script in soup.find_all('script'):
-            s = script.string or ""
+            s = (script.string or "").encode("utf-8")
             if not s:
                 continue
-            patterns = [
-                r'"curator":\s*{\s*"displayName":\s*"([^"]+)"',
-                r'"curator":\s*{\s*"login":\s*"([^"]+)"',
-                r'"createdBy":\s*"([^"]+)"',
-                r'"clipCreator":\s*"([^"]+)"',
-                r'Created by @([A-Za-z0-9_]+)',
-                r'Clipped by @([A-Za-z0-9_]+)',
-            ]
-            for pat in patterns:
-                m = re.search(pat, s)
+            for pat in CREATOR_PATTERNS:
+                m = pat.search(s)
                 if m:
-                    creator = clean_html_entities(m.group(1))
-                    if creator and creator.startswith('@'):
-                        creator = creator[1:]
+                    creator = m.group(1).decode("utf-8")
                     break
             if creator:
                 break
 
-    if title:
-        title = clean_html_entities(title)
-        title = re.sub(r'\s*-\s*Twitch\s*Clips?\s*$', '', title, flags=re.IGNORECASE)
-        if title.strip() == "Twitch":
-            title = None
-    if creator:
-        creator = clean_html_entities(creator)
-        if creator and creator.startswith('@'):
-            creator = creator[1:]
+    return finish_clip_info(title, creator)
 
-    return {"title": title, "creator": creator}
+def clip_info_from_scanner(scanner: ClipPageScanner) -> Dict[str, Optional[str]]:
+    title, creator = scanner.result()
+    if not (title or creator) and scanner.has_metadata():
+        # Markup the fast path could not read; let BeautifulSoup have a go
+        return parse_clip_page_soup(scanner.buffer.decode("utf-8", "replace"))
+    return finish_clip_info(title, creator)
+
+def parse_clip_page(html_content: str) -> Dict[str, Optional[str]]:
+    scanner = ClipPageScanner()
+    scanner.feed(html_content.encode("utf-8"))
+    return clip_info_from_scanner(scanner)
 
 async def fetch_with_retries(session: aiohttp.ClientSession, method: str, url: str, *,
                              headers: Optional[dict] = None,
                              json_body: Optional[dict] = None,
-                             timeout: int = HTTP_TIMEOUT,
-                             retries: int = RETRIES,
-                             backoff: float = BACKOFF):
+                             timeout: Optional[int] = None,
+                             retries: Optional[int] = None,
+                             backoff: Optional[float] = None,
+                             limiter: Optional[HostRateLimiter] = RATE_LIMITER,
+                             slots: Optional[RequestSlots] = None,
+                             parser_factory: Optional[Callable[[], Any]] = None,
+                             max_bytes: int = MAX_BODY_BYTES,
+                             metrics: Optional[RunMetrics] = METRICS):
+    # With parser_factory, a GET body is not buffered: each chunk goes to
+    # parser.feed() as it arrives, the download stops once feed() returns True
+    # or max_bytes have been read, and the parser is returned. slots is the
+    # run's RequestSlots; without it only the session's connector limits apply.
+    # timeout, retries and backoff default to the knobs' values at call time
+    timeout = HTTP_TIMEOUT if timeout is None else timeout
+    retries = RETRIES if retries is None else retries
+    backoff = BACKOFF if backoff is None else backoff
+    stats = metrics.stats(method, url) if metrics is not None else None
     for attempt in range(1, retries + 1):
+        if stats is not None and attempt > 1:
+            stats.retries += 1
+        if limiter is not None:
+            waited = time.monotonic()
+            try:
+                await limiter.acquire(url)
+            except CircuitOpenError:
+                if stats is not None:
+                    stats.errors["CircuitOpenError"] += 1
+                    stats.gave_up += 1
+                return None
+            if stats is not None:
+                stats.limiter_wait.add(time.monotonic() - waited)
+        # Back-off sleeps happen after the slot is released, so a retrying
+        # request doesn't hold up others to the same host
+        delay = None
         try:
             if method == "GET":
-                async with session.get(url, headers=headers, timeout=timeout) as resp:
-                    if resp.status in RETRYABLE:
-                        await asyncio.sleep((backoff ** attempt) + random.uniform(0, 0.4))
-                        continue
-                    if 200 <= resp.status < 300:
-                        return await resp.text()
-                    await asyncio.sleep((backoff ** attempt) / 2 + random.uniform(0, 0.2))
+                request = session.get(url, headers=headers, timeout=timeout)
             else:  # POST
-                async with session.post(url, json=json_body, headers=headers, timeout=timeout) as resp:
-                    if resp.status in RETRYABLE:
-                        await asyncio.sleep((backoff ** attempt) + random.uniform(0, 0.4))
-                        continue
-                    if 200 <= resp.status < 300:
-                        try:
-                            return await resp.json(content_type=None)
-                        except Exception:
-                            return None
-                    await asyncio.sleep((backoff ** attempt) / 2 + random.uniform(0, 0.2))
-        except (aiohttp.ClientError, asyncio.TimeoutError):
-            await asyncio.sleep((backoff ** attempt) / 2 + random.uniform(0, 0.2))
+                request = session.post(url, json=json_body, headers=headers, timeout=timeout)
+            waited = time.monotonic()
+            async with (slots.slot(url) if slots is not None else nullcontext()):
+                sent = time.monotonic()
+                if stats is not None:
+                    stats.slot_wait.add(sent - waited)
+                try:
+                    async with request as resp:
+                        if stats is not None:
+                            stats.statuses[resp.status] += 1
+                        if resp.status == 429 and limiter is not None:
+                            # The limiter holds back every request to this host, not just ours
+                            limiter.throttled(url, parse_retry_after(resp.headers.get("Retry-After")),
+                                              default_wait=backoff ** attempt)
+                            continue
+                        if resp.status in RETRYABLE:
+                            if limiter is not None:
+                                limiter.failed(url)
+                            delay = (backoff ** attempt) + random.uniform(0, 0.4)
+                            continue
+                        if limiter is not None:
+                            limiter.succeeded(url)
+                        if 200 <= resp.status < 300:
+                            if method == "GET" and parser_factory is not None:
+                                return await stream_body(resp, parser_factory(), max_bytes)
+                            if method == "GET":
+                                return await resp.text()
+                            try:
+                                return await resp.json(content_type=None)
+                            except Exception:
+                                return None
+                        delay = (backoff ** attempt) / 2 + random.uniform(0, 0.2)
+                finally:
+                    if stats is not None:
+                        stats.latency.add(time.monotonic() - sent)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if stats is not None:
+                stats.errors[type(e).__name__] += 1
+            if limiter is not None:
+                limiter.failed(url)
+            delay = (backoff ** attempt) / 2 + random.uniform(0, 0.2)
+        finally:
+            # No back-off after the last attempt: there is nothing left to wait for
+            if delay is not None and attempt < retries:
+                await asyncio.sleep(delay)
+    if stats is not None:
+        stats.gave_up += 1
     return None
 
-async def try_twitch_gql_api(session: aiohttp.ClientSession, clip_id: str) -> Dict[str, Optional[str]]:
-    if not clip_id:
-        return {"title": None, "creator": None}
-
-    gql_url = "https://gql.twitch.tv/gql"
-    query = {
-        "query": f"""
-        query {{
-            clip(slug: "{clip_id}") {{
-                title
-                curator {{ displayName login }}
-                broadcaster {{ displayName login }}
-            }}
-        }}
-        """
+async def stream_body(resp: aiohttp.ClientResponse, parser, max_bytes: int):
+    read = 0
+    async for chunk in resp.content.iter_chunked(STREAM_CHUNK):
+        read += len(chunk)
+        if parser.feed(chunk) or read >= max_bytes:
+            # Drop the connection rather than drain the rest of the page into
+            # the pool; a fresh connection is cheaper than megabytes of script
+            resp.close()
+            break
+    return parser
+
+GQL_URL          = "https://gql.twitch.tv/gql"
+GQL_CLIENT_ID    = "kimne78kx3ncx6brgo4mv6wki5h1ko"
+GQL_BATCH_SIZE   = 25     # clips per GraphQL request
+GQL_BATCH_WINDOW = 0.05   # seconds to wait for more slugs before sending a batch
+
+# thumbnailURL at the size the watch page shows it; watch.html loads this
+# instead of the Twitch player until the viewer clicks play
+CLIP_FIELDS = ("title durationSeconds thumbnailURL(width: 480, height: 272) "
+               "curator { displayName login } broadcaster { displayName login }")
+# Everything a lookup can find; merge_info fills them in from later sources
+INFO_FIELDS = ("title", "creator", "broadcaster", "thumbnail", "duration")
+
+def build_clip_query(slugs: List[str]) -> dict:
+    # One aliased clip(...) field per slug; the slugs travel as variables, so
+    # nothing from the URL is ever spliced into the query text
+    params = ", ".join(f"$s{i}: ID!" for i in range(len(slugs)))
+    fields = " ".join(f"c{i}: clip(slug: $s{i}) {{ {CLIP_FIELDS} }}" for i in range(len(slugs)))
+    return {
+        "query": f"query ClipInfo({params}) {{ {fields} }}",
+        "variables": {f"s{i}": slug for i, slug in enumerate(slugs)},
     }
 
-    async def one(ua: str):
+def clip_info_from_gql(clip: Optional[dict]) -> Dict[str, Optional[str]]:
+    info = dict.fromkeys(INFO_FIELDS)
+    if not clip:
+        return info
+    curator = clip.get("curator") or {}
+    broadcaster = clip.get("broadcaster") or {}
+    info["title"] = clip.get("title")
+    info["creator"] = curator.get("displayName") or curator.get("login")
+    info["broadcaster"] = broadcaster.get("displayName") or broadcaster.get("login")
+    info["thumbnail"] = clip.get("thumbnailURL")
+    info["duration"] = clip.get("durationSeconds")
+    return info
+
+class GqlClipResolver:
+    # Collects the slugs asked for within GQL_BATCH_WINDOW and resolves them
+    # with one request per GQL_BATCH_SIZE. Concurrent callers for the same
+    # slug share one lookup, and a resolved slug is never asked for again.
+
+    def __init__(self, session: aiohttp.ClientSession, url: Optional[str] = None,
+                 batch_size: Optional[int] = None, window: Optional[float] = None,
+                 limiter: Optional[HostRateLimiter] = RATE_LIMITER, slots: Optional[RequestSlots] = None):
+        self.session = session
+        self.url = GQL_URL if url is None else url
+        self.limiter = limiter
+        self.slots = slots
+        self.batch_size = GQL_BATCH_SIZE if batch_size is None else batch_size
+        self.window = GQL_BATCH_WINDOW if window is None else window
+        self.requests = 0
+        self._lookups: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def resolve(self, slug: str) -> Dict[str, Optional[str]]:
+        lookup = self._lookups.get(slug)
+        if lookup is None:
+            lookup = asyncio.get_running_loop().create_future()
+            self._lookups[slug] = lookup
+            self._pending.append(slug)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # shield: one caller being cancelled must not cancel the shared lookup
+        return dict(await asyncio.shield(lookup))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, slugs: List[str]):
         headers = {
-            "Client-ID": "kimne78kx3ncx6brgo4mv6wki5h1ko",
+            "Client-ID": GQL_CLIENT_ID,
             "Content-Type": "application/json",
-            "User-Agent": ua,
+            "User-Agent": pick_ua(),
             "Accept": "*/*",
             "Origin": "https://www.twitch.tv",
             "Referer": "https://www.twitch.tv/",
         }
-        return await fetch_with_retries(session=session, method="POST", url=gql_url,
-                                        headers=headers, json_body=query)
-
-    tasks = [one(ua) for ua in USER_AGENTS]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    best = {"title": None, "creator": None}
-    for res in results:
-        if not isinstance(res, dict):
-            continue
-        clip = res.get("data", {}).get("clip") if isinstance(res, dict) else None
-        if not clip:
-            continue
-        title = clip.get("title")
-        creator = None
-        curator = clip.get("curator") or {}
-        if curator.get("displayName"):
-            creator = curator["displayName"]
-        elif curator.get("login"):
-            creator = curator["login"]
-        if title and not best["title"]:
-            best["title"] = title
-        if creator and not best["creator"]:
-            best["creator"] = creator
-        if best["title"] and best["creator"]:
-            break
-
-    return best
+        self.requests += 1
+        METRICS.gql_batch(len(slugs))
+        try:
+            res = await fetch_with_retries(self.session, "POST", self.url, headers=headers,
+                                           json_body=build_clip_query(slugs), limiter=self.limiter,
+                                           slots=self.slots)
+        except Exception:
+            res = None
+        data = res.get("data") if isinstance(res, dict) else None
+        for i, slug in enumerate(slugs):
+            lookup = self._lookups[slug]
+            if isinstance(data, dict):
+                lookup.set_result(clip_info_from_gql(data.get(f"c{i}")))
+            else:
+                # The request failed as a whole: answer the waiters with
+                # nothing and let a later caller try again
+                del self._lookups[slug]
+                lookup.set_result(dict(clip_info_from_gql(None), failed=True))
 
 def merge_info(base: Dict[str, Optional[str]], new: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
     out = dict(base)
-    if not out.get("title") and new.get("title"):
-        out["title"] = new["title"]
-    if not out.get("creator") and new.get("creator"):
-        out["creator"] = new["creator"]
+    for field in INFO_FIELDS:
+        if not out.get(field) and new.get(field):
+            out[field] = new[field]
     return out
 
-async def scrape_clip(session: aiohttp.ClientSession, url: str, debug: bool = False) -> Dict[str, Optional[str]]:
+def broadcaster_from_url(url: str) -> Optional[str]:
+    # www.twitch.tv/<broadcaster>/clip/<slug>
+    m = re.search(r'twitch\.tv/([A-Za-z0-9_]+)/clip/', url)
+    return m.group(1) if m else None
+
+async def scrape_clip(session: aiohttp.ClientSession, url: str,
+                      resolver: Optional[GqlClipResolver] = None, slots: Optional[RequestSlots] = None,
+                      metrics: Optional[RunMetrics] = METRICS) -> Dict[str, Optional[str]]:
+    # Comes back with not_found=True if nothing was found because Twitch
+    # said so: GraphQL answered without the clip, or a clip page loaded
+    # without metadata. Requests that failed or gave up don't count.
     clip_id = get_clip_id(url)
-    best = {"title": None, "creator": None}
+    best = dict.fromkeys(INFO_FIELDS)
+    best["broadcaster"] = broadcaster_from_url(url)
+    answered = False
 
     # 1) GraphQL first
     if clip_id:
-        best = merge_info(best, await try_twitch_gql_api(session, clip_id))
+        resolver = resolver or GqlClipResolver(session, slots=slots)
+        gql = await resolver.resolve(clip_id)
+        answered = not gql.get("failed")
+        best = merge_info(best, gql)
         if best["title"] and best["creator"]:
+            if metrics is not None:
+                metrics.strategy("gql")
             return best
 
     # 2) HTML scraping (only if needed)
@@ -269,81 +408,227 @@ async def scrape_clip(session: aiohttp.ClientSession, url: str, debug: bool = Fa
             "Upgrade-Insecure-Requests": "1",
             "Cache-Control": "no-cache",
         }
-        text = await fetch_with_retries(session, "GET", u, headers=headers)
-        if not text:
-            return {"title": None, "creator": None}
-        return parse_clip_page(text)
+        scanner = await fetch_with_retries(session, "GET", u, headers=headers, slots=slots,
+                                           parser_factory=ClipPageScanner)
+        if scanner is None:
+            return {"title": None, "creator": None, "source": None, "failed": True}
+        info = clip_info_from_scanner(scanner)
+        # Without a source of its own the scanner handed over to BeautifulSoup
+        info["source"] = scanner.source() or ("soup" if scanner.has_metadata() else None)
+        return info
 
     tasks = [asyncio.create_task(fetch_and_parse(u)) for u in deduped]
+    strategy = "none"
     for coro in asyncio.as_completed(tasks):
         parsed = await coro
+        answered = answered or not parsed.get("failed")
         best = merge_info(best, parsed)
         if best["title"] and best["creator"]:
+            strategy = parsed["source"] or "none"
             for t in tasks:
                 if not t.done():
                     t.cancel()
             break
-
+    else:
+        if best["title"] or best["creator"]:
+            strategy = "partial"
+        elif answered:
+            best["not_found"] = True
+
+    if metrics is not None:
+        metrics.strategy(strategy)
     return best
 
-async def process_category(session: aiohttp.ClientSession, category_name: str, urls: List[str], debug: bool = False) -> List[Dict[str, Optional[str]]]:
-    print(f"\n{'='*60}\nProcessing category: {category_name}\n{'='*60}")
-    results: List[Dict[str, Optional[str]]] = []
-    sem = asyncio.Semaphore(MAX_CONCURRENCY)
-
-    async def one(u: str, idx: int, total: int):
-        async with sem:
+async def cached_scrape_clip(session: aiohttp.ClientSession, url: str, cache: Optional[MetadataCache],
+                             debug: bool = False, resolver: Optional[GqlClipResolver] = None,
+                             slots: Optional[RequestSlots] = None,
+                             metrics: Optional[RunMetrics] = METRICS) -> Dict[str, Optional[str]]:
+    # Keyed by slug, so the same clip under another URL form is a hit too
+    key = get_clip_id(url) or url
+    if cache is not None:
+        info = cache.get(key)
+        if info is not None:
+            if metrics is not None:
+                metrics.strategy("cache")
             if debug:
-                print(f"[{category_name}] {idx+1}/{total}: {u}")
-            info = await scrape_clip(session, u, debug=debug)
-            if debug:
-                print(f"  Final -> title={info.get('title')!r} | creator={info.get('creator')!r}")
-            return {"url": u, "title": info.get("title"), "clip_creator": info.get("creator")}
-
-    tasks = [asyncio.create_task(one(u, i, len(urls))) for i, u in enumerate(urls)]
-    done = []
-    for t in asyncio.as_completed(tasks):
-        done.append(await t)
-
-    # keep original order
-    url_to_result = {r["url"]: r for r in done}
-    ordered = [url_to_result[u] for u in urls]
-    return ordered
-
-async def run_all():
+                log(f"  cached: {url}")
+            return info
+    info = await scrape_clip(session, url, resolver=resolver, slots=slots, metrics=metrics)
+    not_found = info.pop("not_found", False)
+    if debug:
+        log(f"  {url}\n    -> title={info.get('title')!r} | creator={info.get('creator')!r}")
+    # An empty result is only cached if Twitch said the clip isn't there. After
+    # a 429, an open circuit or a network error the next run has to ask again.
+    if cache is not None and (info.get("title") or info.get("creator") or not_found):
+        cache.put(key, info)
+    return info
+
+def open_session(trace_configs: Optional[List[aiohttp.TraceConfig]] = None) -> aiohttp.ClientSession:
     conn = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, limit_per_host=PER_HOST_LIMIT, ttl_dns_cache=300)
     timeout = aiohttp.ClientTimeout(total=None, connect=HTTP_TIMEOUT, sock_connect=HTTP_TIMEOUT, sock_read=HTTP_TIMEOUT)
-
-    async with aiohttp.ClientSession(
+    return aiohttp.ClientSession(
         connector=conn,
+        trace_configs=[trace_config(METRICS)] + (trace_configs or []),
         timeout=timeout,
         headers={"User-Agent": pick_ua(), "Accept": "*/*"},
         raise_for_status=False,
         trust_env=True,
-    ) as session:
-        all_results: Dict[str, List[Dict[str, Optional[str]]]] = {}
-
-        cat_tasks = {
-            category_name: asyncio.create_task(process_category(session, category_name, urls, debug=True))
-            for category_name, urls in CLIP_CATEGORIES.items()
-        }
-
-        for category_name, task in cat_tasks.items():
-            category_results = await task
-            all_results[category_name] = category_results
-
-            filename = f"clips_{category_name.lower()}.json"
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(category_results, f, ensure_ascii=False, indent=2)
-            print(f"\nSaved {len(category_results)} clips to {filename}")
-
-        print(f"\n{'='*60}\nFINAL SUMMARY\n{'='*60}")
-        for category, clips in all_results.items():
-            successful = sum(1 for c in clips if c.get('title') or c.get('clip_creator'))
-            print(f"{category}: {successful}/{len(clips)} successful")
-
-def main():
-    asyncio.run(run_all())
+    )
+
+def write_run_report(path: str, queue: WorkQueue, cache: Optional[MetadataCache]):
+    # METRICS plus what the queue, cache and rate limiter know, as JSON
+    METRICS.write_report(
+        path,
+        clips={"total": queue.total, "failed": queue.failed},
+        cache={"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
+        hosts={host: {"requests": s.requests, "throttled": s.throttled, "circuit_trips": s.trips,
+                      "rate": round(s.rate, 2)}
+               for host, s in RATE_LIMITER.hosts.items()},
+    )
+    log(f"Run report written to {path}")
+
+async def lookup_clips(urls: List[str], cache: Optional[MetadataCache] = None,
+                      debug: bool = False) -> List[Dict[str, Optional[str]]]:
+    # Metadata for each URL, in order; what resolve_clips() runs
+    METRICS.reset()
+    slots = RequestSlots(MAX_CONCURRENCY, PER_HOST_LIMIT)
+    async with open_session() as session:
+        resolver = GqlClipResolver(session, slots=slots)
+        async with WorkQueue(CLIP_WORKERS, progress_interval=PROGRESS_INTERVAL if debug else 0,
+                             log=log) as queue:
+            lookups = [
+                queue.submit(get_clip_id(u) or u,
+                             lambda u=u: cached_scrape_clip(session, u, cache, debug=debug, resolver=resolver,
+                                                            slots=slots))
+                for u in urls
+            ]
+            return list(await asyncio.gather(*lookups))
+
+async def run_all(categories: Dict[str, List[str]], cache: Optional[MetadataCache] = None,
+                  output_dir: Optional[str] = ".", as_json: bool = False, report: Optional[str] = None,
+                  session_factory: Callable[[], Any] = open_session,
+                  checkpoint: Optional[Checkpoint] = None, resume: bool = False):
+    # session_factory lets benchmarks/fetcher_replay.py record or replay the run.
+    # Without a checkpoint, one is kept in output_dir; with as_json, which
+    # writes no files, in a temporary directory for the length of the run.
+    with ExitStack() as cleanup:
+        if checkpoint is None:
+            if as_json:
+                checkpoint_dir = cleanup.enter_context(tempfile.TemporaryDirectory(prefix="clip-fetcher-"))
+            else:
+                checkpoint_dir = output_dir
+            checkpoint = Checkpoint(str(Path(checkpoint_dir) / CHECKPOINT_NAME), resume=resume)
+            cleanup.callback(checkpoint.close)
+
+        METRICS.reset()
+        # With resume, clips a previous run resolved are not looked up again
+        done = checkpoint.resolved() if resume else {}
+        if done:
+            log(f"Resuming: {len(done)} clips already resolved in {checkpoint.path}")
+
+        slots = RequestSlots(MAX_CONCURRENCY, PER_HOST_LIMIT)
+        async with session_factory() as session:
+            all_results: Dict[str, List[Dict[str, Optional[str]]]] = {}
+            # Shared by all clips: their slugs go out in the same batches
+            resolver = GqlClipResolver(session, slots=slots)
+
+            async def lookup(u: str, slug: str) -> Dict[str, Optional[str]]:
+                info = await cached_scrape_clip(session, u, cache, debug=True, resolver=resolver, slots=slots)
+                checkpoint.record(slug, u, info)
+                return info
+
+            async def category_done(category_name: str, jobs: List[asyncio.Future]) -> str:
+                await asyncio.gather(*jobs)
+                return category_name
+
+            async with WorkQueue(CLIP_WORKERS, log=log) as queue:
+                # One job per clip for the whole run. A clip listed in several
+                # categories is looked up once; earlier categories go first so
+                # their files are written while the rest is still running.
+                lookups = {}
+                for priority, (category_name, urls) in enumerate(categories.items()):
+                    lookups[category_name] = [
+                        queue.submit(slug, lambda u=u, slug=slug: lookup(u, slug), priority=priority)
+                        for slug, u in ((get_clip_id(u) or u, u) for u in urls)
+                        if slug not in done
+                    ]
+                log(f"Queued {queue.total} clips ({sum(len(u) for u in categories.values())} listed)")
+
+                # Each category file is written as soon as its own clips are
+                # done, from the checkpoint
+                for finished in asyncio.as_completed([category_done(name, jobs) for name, jobs in lookups.items()]):
+                    category_name = await finished
+                    resolved = checkpoint.load()
+                    category_results = [
+                        {"url": u, "title": info.get("title"), "clip_creator": info.get("creator"),
+                         "thumbnail": info.get("thumbnail"), "duration": info.get("duration")}
+                        for u, info in ((u, resolved.get(get_clip_id(u) or u, {})) for u in categories[category_name])
+                    ]
+                    all_results[category_name] = category_results
+                    if as_json:
+                        continue
 
-if __name__ == "__main__":
-    main()
+                    filename = Path(output_dir) / f"clips_{category_name.lower()}.json"
+                    with open(filename, "w", encoding="utf-8") as f:
+                        json.dump(category_results, f, ensure_ascii=False, indent=2)
+                    log(f"\nSaved {len(category_results)} clips to {filename}")
+
+            log(f"\n{'='*60}\nFINAL SUMMARY\n{'='*60}")
+            for category in categories:
+                clips = all_results[category]
+                successful = sum(1 for c in clips if c.get('title') or c.get('clip_creator'))
+                log(f"{category}: {successful}/{len(clips)} successful")
+            if cache is not None:
+                log(f"Cache: {cache.hits} hits, {cache.misses} fetched")
+            log(f"GraphQL: {resolver.requests} requests")
+            log(RATE_LIMITER.summary())
+            log(METRICS.summary())
+            if report:
+                write_run_report(report, queue, cache)
+            if as_json:
+                json.dump({category: all_results[category] for category in categories}, sys.stdout,
+                          ensure_ascii=False, indent=2)
+                sys.stdout.write("\n")
+
+async def update_config(categories: Dict[str, List[str]], config_path: str, output: Optional[str] = None,
+                        cache: Optional[MetadataCache] = None, dry_run: bool = False,
+                        report: Optional[str] = None):
+    # Resolve only the clips config.toml lacks (or lacks title, creator or
+    # thumbnail for)
+    # and merge them into it, instead of refetching every clip
+    with open(config_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    changes = plan_update(categories, text)
+    new = sum(1 for c in changes if c.line is None)
+    log(f"{config_path}: {new} new clips, {len(changes) - new} missing title, creator or thumbnail")
+    if not changes:
+        return
+
+    METRICS.reset()
+    slots = RequestSlots(MAX_CONCURRENCY, PER_HOST_LIMIT)
+    async with open_session() as session:
+        resolver = GqlClipResolver(session, slots=slots)
+        async with WorkQueue(CLIP_WORKERS, log=log) as queue:
+            lookups = {
+                c.slug: queue.submit(c.slug, lambda slug=c.slug: cached_scrape_clip(
+                    session, EMBED_URL.format(slug=slug), cache, debug=True, resolver=resolver, slots=slots))
+                for c in changes
+            }
+            infos = {slug: await lookup for slug, lookup in lookups.items()}
+    log(METRICS.summary())
+    if report:
+        write_run_report(report, queue, cache)
+
+    updated, applied = apply_update(text, changes, infos)
+    for c in changes:
+        # What ends up in the file: a fill keeps the title and creator it had
+        info = infos[c.slug] if c.line is None else fill_in(c.existing, infos[c.slug])
+        action = "add" if c.line is None else "fill"
+        log(f"  {action} {c.category}/{c.slug}: title={info.get('title')!r} creator={info.get('creator')!r} "
+            f"thumbnail={'yes' if info.get('thumbnail') else 'no'}")
+    if dry_run:
+        log(f"Dry run: {applied} clips would change")
+        return
+    target = output or config_path
+    write_atomic(target, updated)
+    log(f"Wrote {applied} clips to {target}")
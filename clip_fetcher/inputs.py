@@ -0,0 +1,46 @@
+import json
+from typing import Dict, Iterable, List, TextIO
+
+# Category for URLs listed before any [Category] header
+DEFAULT_CATEGORY = "Clips"
+
+
+def parse_url_list(lines: Iterable[str]) -> Dict[str, List[str]]:
+    # One clip URL per line. "[Rage_Moment]" starts a category, blank lines
+    # and "# comments" are skipped:
+    #
+    #   [Rage_Moment]
+    #   https://www.twitch.tv/cherryylein/clip/NimbleSpicyLaptopRedCoat-WAD9mL3joUsYdUe1
+    #   # https://clips.twitch.tv/QuaintResoluteScallionMcaT-emVEWVvSBaBlRzMr
+    categories: Dict[str, List[str]] = {}
+    category = DEFAULT_CATEGORY
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            category = line[1:-1].strip()
+            categories.setdefault(category, [])
+            continue
+        categories.setdefault(category, []).append(line)
+    return categories
+
+
+def read_url_list(f: TextIO) -> Dict[str, List[str]]:
+    # A URL list as above, or a JSON object shaped like CLIP_CATEGORIES
+    text = f.read()
+    if text.lstrip().startswith("{"):
+        data = json.loads(text)
+        if not all(isinstance(urls, list) for urls in data.values()):
+            raise ValueError("expected a JSON object of category -> list of URLs")
+        return {name: [str(u) for u in urls] for name, urls in data.items()}
+    return parse_url_list(text.splitlines())
+
+
+def merge_url_lists(lists: Iterable[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    # Later inputs append to categories of the same name
+    merged: Dict[str, List[str]] = {}
+    for categories in lists:
+        for name, urls in categories.items():
+            merged.setdefault(name, []).extend(urls)
+    return merged
@@ -0,0 +1,81 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# Default cache file, next to the package
+CACHE_PATH = Path(__file__).resolve().parent / "clips_cache.db"
+
+# Fresh entries are served without touching the network
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+# Clips Twitch reported missing (deleted, or never existed) are retried much
+# sooner than successful lookups. Failed lookups are not cached at all.
+NEGATIVE_TTL = 6 * 3600
+
+
+class MetadataCache:
+    # Clip metadata by Twitch slug in a small SQLite file, so a rerun only
+    # scrapes clips it has not seen (or not seen recently)
+
+    def __init__(self, path: str, max_age: float = DEFAULT_MAX_AGE, negative_ttl: float = NEGATIVE_TTL):
+        self.path = path
+        self.max_age = max_age
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS clips (
+                slug TEXT PRIMARY KEY,
+                title TEXT,
+                creator TEXT,
+                broadcaster TEXT,
+                found INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                thumbnail TEXT,
+                duration REAL
+            )"""
+        )
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        # Caches from before thumbnails were collected: add the columns and
+        # let every entry expire, so the next run fetches the thumbnails too
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(clips)")}
+        if "thumbnail" not in columns:
+            self.conn.execute("ALTER TABLE clips ADD COLUMN thumbnail TEXT")
+            self.conn.execute("ALTER TABLE clips ADD COLUMN duration REAL")
+            self.conn.execute("UPDATE clips SET fetched_at = 0")
+
+    def get(self, slug: str) -> Optional[Dict[str, Optional[str]]]:
+        # The cached info if it is still fresh, else None. A fresh negative
+        # entry comes back as an info dict with everything None.
+        row = self.conn.execute(
+            "SELECT title, creator, broadcaster, thumbnail, duration, found, fetched_at FROM clips WHERE slug = ?",
+            (slug,)
+        ).fetchone()
+        if row is not None:
+            title, creator, broadcaster, thumbnail, duration, found, fetched_at = row
+            ttl = self.max_age if found else min(self.max_age, self.negative_ttl)
+            if time.time() - fetched_at < ttl:
+                self.hits += 1
+                return {"title": title, "creator": creator, "broadcaster": broadcaster,
+                        "thumbnail": thumbnail, "duration": duration}
+        self.misses += 1
+        return None
+
+    def put(self, slug: str, info: Dict[str, Optional[str]]):
+        found = bool(info.get("title") or info.get("creator"))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO clips (slug, title, creator, broadcaster, thumbnail, duration, found,"
+                " fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (slug, info.get("title"), info.get("creator"), info.get("broadcaster"), info.get("thumbnail"),
+                 info.get("duration"), int(found), time.time()),
+            )
+
+    def close(self):
+        self.conn.close()
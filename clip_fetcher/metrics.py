@@ -0,0 +1,161 @@
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+# Upper bounds (ms) of the histogram buckets in the run report
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def endpoint(method: str, url: str) -> str:
+    # Requests are grouped per method and host: all clip pages of
+    # clips.twitch.tv are one endpoint, GraphQL is another
+    return f"{method} {urlparse(url).netloc}"
+
+
+class Histogram:
+    # Keeps every sample; a run makes a few thousand requests at most
+
+    def __init__(self):
+        self.samples: List[float] = []
+
+    def add(self, seconds: float):
+        self.samples.append(seconds * 1000)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        # Milliseconds; buckets count samples up to each bound, "inf" the rest
+        if not self.samples:
+            return {"count": 0}
+        buckets = Counter()
+        for ms in self.samples:
+            bound = next((b for b in BUCKETS_MS if ms <= b), "inf")
+            buckets[str(bound)] += 1
+        return {
+            "count": len(self.samples),
+            "mean": round(sum(self.samples) / len(self.samples), 1),
+            "p50": round(self.percentile(50), 1),
+            "p90": round(self.percentile(90), 1),
+            "p99": round(self.percentile(99), 1),
+            "max": round(max(self.samples), 1),
+            "buckets": {str(b): buckets[str(b)] for b in BUCKETS_MS + ("inf",) if buckets[str(b)]},
+        }
+
+
+class EndpointStats:
+    __slots__ = ("latency", "slot_wait", "limiter_wait", "statuses", "errors", "retries", "gave_up")
+
+    def __init__(self):
+        self.latency = Histogram()       # one sample per attempt, request sent to body read
+        self.slot_wait = Histogram()     # waiting for a RequestSlots slot
+        self.limiter_wait = Histogram()  # waiting for the host's rate limiter
+        self.statuses = Counter()
+        self.errors = Counter()          # exception class names
+        self.retries = 0
+        self.gave_up = 0                 # calls that returned None after all attempts
+
+    def to_dict(self) -> dict:
+        return {
+            "latency_ms": self.latency.to_dict(),
+            "slot_wait_ms": self.slot_wait.to_dict(),
+            "limiter_wait_ms": self.limiter_wait.to_dict(),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+        }
+
+
+class RunMetrics:
+    # Where a fetcher run spent its time. fetch_with_retries, the GraphQL
+    # resolver and scrape_clip record into it; aiohttp's tracing adds the
+    # connection pool, DNS and connect timings (see trace_config()).
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self._started_mono = time.monotonic()
+        self.endpoints: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.connections: Dict[str, Histogram] = defaultdict(Histogram)
+        self.strategies = Counter()
+        self.gql_batches = 0
+        self.gql_slugs = 0
+
+    def stats(self, method: str, url: str) -> EndpointStats:
+        return self.endpoints[endpoint(method, url)]
+
+    def strategy(self, name: str):
+        # What resolved a clip: cache, gql, og:title, ld+json, regex, soup or none
+        self.strategies[name] += 1
+
+    def gql_batch(self, size: int):
+        self.gql_batches += 1
+        self.gql_slugs += size
+
+    def report(self, **extra) -> dict:
+        report = {
+            "started_at": self.started,
+            "duration_s": round(time.monotonic() - self._started_mono, 3),
+            "endpoints": {name: s.to_dict() for name, s in sorted(self.endpoints.items())},
+            "connections_ms": {name: h.to_dict() for name, h in sorted(self.connections.items())},
+            "strategies": dict(self.strategies.most_common()),
+            "gql": {"batches": self.gql_batches, "slugs": self.gql_slugs},
+        }
+        report.update(extra)
+        return report
+
+    def write_report(self, path: str, **extra):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2)
+            f.write("\n")
+
+    def summary(self) -> str:
+        lines = []
+        for name, s in sorted(self.endpoints.items()):
+            lat = s.latency
+            if not lat.samples:
+                continue
+            lines.append(f"{name}: {len(lat.samples)} attempts, p50 {lat.percentile(50):.0f} ms, "
+                         f"p90 {lat.percentile(90):.0f} ms, {s.retries} retries, {s.gave_up} gave up")
+        queued = self.connections.get("queued")
+        if queued is not None and queued.samples:
+            lines.append(f"connection pool wait: p90 {queued.percentile(90):.0f} ms")
+        if self.strategies:
+            lines.append("resolved by: " + ", ".join(f"{k} {v}" for k, v in self.strategies.most_common()))
+        return "\n".join(lines)
+
+
+def trace_config(metrics: RunMetrics):
+    # Connection-level timings from aiohttp: waiting for a free connection
+    # in the pool, DNS lookups and establishing new connections
+    import aiohttp
+
+    def timed(name):
+        async def start(session, ctx, params):
+            setattr(ctx, name, time.monotonic())
+
+        async def end(session, ctx, params):
+            started = getattr(ctx, name, None)
+            if started is not None:
+                metrics.connections[name].add(time.monotonic() - started)
+        return start, end
+
+    config = aiohttp.TraceConfig()
+    start, end = timed("queued")
+    config.on_connection_queued_start.append(start)
+    config.on_connection_queued_end.append(end)
+    start, end = timed("connect")
+    config.on_connection_create_start.append(start)
+    config.on_connection_create_end.append(end)
+    start, end = timed("dns")
+    config.on_dns_resolvehost_start.append(start)
+    config.on_dns_resolvehost_end.append(end)
+    return config
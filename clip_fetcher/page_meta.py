@@ -0,0 +1,150 @@
+import json
+import re
+from typing import List, Optional, Tuple
+
+# Everything here works on raw bytes as they arrive, so a page can be fed in
+# chunks and abandoned as soon as the metadata has been seen.
+
+_META_RE    = re.compile(rb"<meta\b[^>]*>", re.I)
+_ATTR_RE    = re.compile(rb"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_LD_OPEN_RE = re.compile(rb"<script\b[^>]*application/ld\+json[^>]*>", re.I)
+_SCRIPT_END = re.compile(rb"</script\s*>", re.I)
+_HEAD_END   = re.compile(rb"</head\s*>", re.I)
+
+CREATOR_PATTERNS = [re.compile(p) for p in (
+    rb'"curator":\s*{\s*"displayName":\s*"([^"]+)"',
+    rb'"curator":\s*{\s*"login":\s*"([^"]+)"',
+    rb'"createdBy":\s*"([^"]+)"',
+    rb'"clipCreator":\s*"([^"]+)"',
+    rb'Created by @([A-Za-z0-9_]+)',
+    rb'Clipped by @([A-Za-z0-9_]+)',
+)]
+
+# A tag that starts this far before the end of the data seen so far is still
+# found once its closing '>' arrives; further back we don't look again
+_TAIL = 4096
+
+
+def split_og_title(t: str) -> Tuple[Optional[str], Optional[str]]:
+    # "<broadcaster> - <title> - Clip Created by @<creator>" -> (title, creator)
+    if " - Clip Created by @" not in t:
+        return t, None
+    parts = t.split(' - Clip Created by @')
+    if len(parts) != 2:
+        return None, None
+    title_part = parts[0].strip()
+    creator = parts[1].strip()
+    if ' - ' in title_part:
+        return ' - '.join(title_part.split(' - ')[1:]), creator
+    return title_part, creator
+
+
+def _attrs(tag: bytes) -> dict:
+    return {k.lower(): (a if a is not None else b) for k, a, b in
+            ((m.group(1), m.group(2), m.group(3)) for m in _ATTR_RE.finditer(tag))}
+
+
+class ClipPageScanner:
+    # Incremental og:title / ld+json extraction for Twitch clip pages. feed()
+    # returns True once title and creator are known, at which point the rest
+    # of the page (mostly script) is not needed.
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.og_title: Optional[str] = None
+        self.ld_json: List[dict] = []
+        self.head_done = False
+        self._meta_pos = 0
+        self._ld_pos = 0
+        self._ld_start = None   # start of an ld+json body whose </script> is still to come
+
+    def feed(self, chunk: bytes) -> bool:
+        self.buffer += chunk
+        self._scan_meta()
+        self._scan_ld_json()
+        return self.done
+
+    def _scan_meta(self):
+        if self.og_title is not None or self.head_done:
+            return
+        buf = self.buffer
+        head_end = _HEAD_END.search(buf, self._meta_pos)
+        end = head_end.start() if head_end else len(buf)
+        for m in _META_RE.finditer(buf, self._meta_pos, end):
+            self._meta_pos = m.end()
+            attrs = _attrs(m.group(0))
+            if (attrs.get(b"property") or attrs.get(b"name")) == b"og:title" and attrs.get(b"content"):
+                self.og_title = attrs[b"content"].decode("utf-8", "replace")
+                return
+        if head_end:
+            self.head_done = True
+        else:
+            self._meta_pos = max(self._meta_pos, len(buf) - _TAIL)
+
+    def _scan_ld_json(self):
+        buf = self.buffer
+        while True:
+            if self._ld_start is None:
+                m = _LD_OPEN_RE.search(buf, self._ld_pos)
+                if not m:
+                    self._ld_pos = max(self._ld_pos, len(buf) - _TAIL)
+                    return
+                self._ld_start = m.end()
+            m = _SCRIPT_END.search(buf, self._ld_start)
+            if not m:
+                return
+            try:
+                data = json.loads(bytes(buf[self._ld_start:m.start()]))
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                self.ld_json.append(data)
+            self._ld_start = None
+            self._ld_pos = m.end()
+
+    def _from_metadata(self) -> Tuple[Optional[str], Optional[str]]:
+        title, creator = split_og_title(self.og_title) if self.og_title else (None, None)
+        for data in self.ld_json:
+            if title and creator:
+                break
+            if not title and 'name' in data:
+                title = data['name']
+            c = data.get('creator')
+            if not creator and isinstance(c, dict) and 'name' in c:
+                creator = c['name']
+        return title, creator
+
+    @property
+    def done(self) -> bool:
+        title, creator = self._from_metadata()
+        return bool(title and creator)
+
+    def has_metadata(self) -> bool:
+        # Whether the page has anything a real HTML parser might make more of
+        return b"og:title" in self.buffer or b"ld+json" in self.buffer
+
+    def result(self) -> Tuple[Optional[str], Optional[str]]:
+        # Raw (title, creator); the creator falls back to the script patterns
+        title, creator = self._from_metadata()
+        if not creator:
+            for pattern in CREATOR_PATTERNS:
+                m = pattern.search(self.buffer)
+                if m:
+                    creator = m.group(1).decode("utf-8", "replace")
+                    break
+        return title, creator
+
+    def source(self) -> Optional[str]:
+        # Which part of the page result() got its data from: "og:title",
+        # "ld+json" or "regex" (the creator came from the script patterns)
+        og_title, og_creator = split_og_title(self.og_title) if self.og_title else (None, None)
+        if og_title and og_creator:
+            return "og:title"
+        title, creator = self._from_metadata()
+        if title and creator:
+            return "ld+json"
+        if not creator and self.result()[1]:
+            return "regex"
+        if title:
+            return "og:title" if og_title else "ld+json"
+        return None
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+# Requests per second a host starts at, and the bounds AIMD moves it within
+INITIAL_RATE   = 10.0
+MIN_RATE       = 0.5
+MAX_RATE       = 50.0
+BURST          = 8        # requests a host may get back to back after idling
+RATE_INCREASE  = 0.5      # added to the rate per successful response
+RATE_DECREASE  = 0.5      # rate is multiplied by this on a 429
+# Circuit breaker: this many failures in a row (5xx, timeouts, connection
+# errors) stop all requests to the host for a cooldown that doubles each time
+# the host is still failing afterwards
+FAILURE_THRESHOLD = 5
+COOLDOWN          = 15.0
+MAX_COOLDOWN      = 300.0
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    __slots__ = ("rate", "next_slot", "blocked_until", "failures", "open_until", "cooldown", "probing",
+                 "requests", "throttled", "trips")
+
+    def __init__(self):
+        self.rate = INITIAL_RATE
+        self.next_slot = 0.0          # earliest time the next request may start
+        self.blocked_until = 0.0      # set by 429 / Retry-After
+        self.failures = 0             # consecutive
+        self.open_until = None        # None: circuit closed
+        self.cooldown = COOLDOWN
+        self.probing = False          # half-open: one request is testing the host
+        self.requests = 0
+        self.throttled = 0
+        self.trips = 0
+
+
+class HostRateLimiter:
+    # Token bucket per host, shared by every fetcher coroutine, so a 429 slows
+    # all requests to that host down instead of only the one that got it.
+    # The loop is single-threaded, so reservations need no lock: each
+    # acquire() takes the next free slot and sleeps until it comes.
+
+    def __init__(self):
+        self.hosts: Dict[str, HostState] = {}
+
+    def _host(self, url: str) -> HostState:
+        host = urlparse(url).netloc
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState()
+        return state
+
+    async def acquire(self, url: str):
+        state = self._host(url)
+        while True:
+            now = time.monotonic()
+            if state.open_until is not None:
+                if now < state.open_until:
+                    raise CircuitOpenError(urlparse(url).netloc)
+                # Half-open: this request decides. Everyone else keeps failing
+                # fast until it reports back (or never does, e.g. cancelled)
+                state.probing = True
+                state.open_until = now + state.cooldown
+            interval = 1.0 / state.rate
+            slot = max(state.next_slot, now - (BURST - 1) * interval, state.blocked_until)
+            state.next_slot = slot + interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            # A 429 that arrived while we slept pushes us behind its Retry-After
+            if state.blocked_until <= time.monotonic():
+                state.requests += 1
+                return
+
+    def succeeded(self, url: str):
+        state = self._host(url)
+        state.rate = min(MAX_RATE, state.rate + RATE_INCREASE)
+        state.failures = 0
+        if state.open_until is not None:
+            state.open_until = None
+            state.probing = False
+            state.cooldown = COOLDOWN
+
+    def throttled(self, url: str, retry_after: Optional[float], default_wait: float):
+        state = self._host(url)
+        state.throttled += 1
+        now = time.monotonic()
+        # Requests already in flight tend to get their 429s together; halve
+        # once per back-off, not once per response
+        if now >= state.blocked_until:
+            state.rate = max(MIN_RATE, state.rate * RATE_DECREASE)
+        wait = retry_after if retry_after is not None else default_wait
+        state.blocked_until = max(state.blocked_until, now + wait)
+        if state.probing:
+            # The host answers, it just wants us slower; close the circuit
+            state.open_until = None
+            state.probing = False
+
+    def failed(self, url: str):
+        state = self._host(url)
+        state.failures += 1
+        if state.probing:
+            state.probing = False
+            state.cooldown = min(MAX_COOLDOWN, state.cooldown * 2)
+            state.open_until = time.monotonic() + state.cooldown
+            state.trips += 1
+        elif state.open_until is None and state.failures >= FAILURE_THRESHOLD:
+            state.open_until = time.monotonic() + state.cooldown
+            state.trips += 1
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"{host}: {s.requests} requests, {s.throttled} throttled, {s.trips} circuit trips, "
+            f"rate now {s.rate:.1f}/s"
+            for host, s in self.hosts.items()
+        )
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Iterable, List, NamedTuple, Optional
+
+from .metadata_cache import CACHE_PATH, DEFAULT_MAX_AGE, MetadataCache
+from .slugs import get_clip_id
+
+
+class ClipInfo(NamedTuple):
+    url: str
+    slug: str
+    title: Optional[str]
+    creator: Optional[str]
+    broadcaster: Optional[str]
+    thumbnail: Optional[str] = None
+    duration: Optional[float] = None    # seconds
+
+
+def resolve_clips(urls: Iterable[str], cache_path: Optional[str] = str(CACHE_PATH),
+                  max_age: float = DEFAULT_MAX_AGE, debug: bool = False) -> List[ClipInfo]:
+    # Blocking entry point for scripts and cron jobs: title, creator,
+    # broadcaster, thumbnail and duration for each URL, in order. Clips that could not be resolved
+    # come back with None fields. Pass cache_path=None to skip the cache.
+    # Runs its own event loop, so it can't be called from async code; await
+    # fetcher.lookup_clips() there instead.
+    from .fetcher import lookup_clips  # aiohttp is only needed from here on
+
+    urls = list(urls)
+    cache = MetadataCache(cache_path, max_age=max_age) if cache_path is not None else None
+    try:
+        infos = asyncio.run(lookup_clips(urls, cache, debug=debug))
+    finally:
+        if cache is not None:
+            cache.close()
+    return [
+        ClipInfo(u, get_clip_id(u) or u, info.get("title"), info.get("creator"), info.get("broadcaster"),
+                 info.get("thumbnail"), info.get("duration"))
+        for u, info in zip(urls, infos)
+    ]
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict
+from urllib.parse import urlparse
+
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+
+
+class RequestSlots:
+    # Caps requests in flight, overall and per host. Sized like the
+    # TCPConnector pool, so a request that got a slot also gets a connection
+    # right away instead of waiting for one inside aiohttp, where the wait
+    # counts against its connect timeout. Its semaphores belong to the event
+    # loop that first waits on them, so every run creates its own.
+
+    def __init__(self, total: int, per_host: int):
+        self._total = asyncio.Semaphore(total)
+        self._hosts = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        # Host first: waiting for a busy host must not hold a global slot
+        async with self._hosts[urlparse(url).netloc]:
+            async with self._total:
+                yield
+
+
+class WorkQueue:
+    # One queue of jobs for the whole run, worked off by a fixed number of
+    # workers. Jobs are deduplicated by key: submitting a key again returns
+    # the first submission's future. Lower priority values run first; within
+    # a priority, jobs run in submission order.
+
+    def __init__(self, workers: int, progress_interval: float = PROGRESS_INTERVAL, log=print):
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.log = log
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._jobs: Dict[Any, asyncio.Future] = {}
+        self._seq = itertools.count()
+        self._tasks = []
+        self._started = None
+
+    def submit(self, key, job: Callable[[], Awaitable], priority: int = 0) -> asyncio.Future:
+        future = self._jobs.get(key)
+        if future is None:
+            future = self._jobs[key] = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((priority, next(self._seq), key, job))
+            self.total += 1
+        return future
+
+    async def _worker(self):
+        while True:
+            _, _, key, job = await self._queue.get()
+            future = self._jobs[key]
+            self.running += 1
+            try:
+                future.set_result(await job())
+            except Exception as e:
+                self.failed += 1
+                future.set_exception(e)
+            finally:
+                self.running -= 1
+                self.done += 1
+                self._queue.task_done()
+
+    def progress(self) -> str:
+        elapsed = time.monotonic() - self._started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        return (f"[progress] {self.done}/{self.total} done ({self.failed} failed), "
+                f"{self._queue.qsize()} queued, {self.running} running, {rate:.1f}/s, ETA {eta}")
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self.log(self.progress())
+
+    async def __aenter__(self):
+        self._started = time.monotonic()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.progress_interval:
+            self._tasks.append(asyncio.create_task(self._report()))
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            if exc[0] is None:
+                await self._queue.join()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if exc[0] is None and self.progress_interval:
+            self.log(self.progress())
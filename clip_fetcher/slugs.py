@@ -0,0 +1,27 @@
+import re
+from urllib.parse import urlparse, parse_qs
+
+_SLUG_RE = re.compile(r"(?:clip/|clips\.twitch\.tv/)([A-Za-z0-9_-]+)")
+
+
+def get_clip_id(url: str) -> str:
+    parsed = urlparse(url)
+    if parsed.netloc.endswith("clips.twitch.tv"):
+        slug = parsed.path.strip("/").split("/")[0]
+        if slug == "embed":
+            # Player URLs as used in config.toml: clips.twitch.tv/embed?clip=<slug>
+            return parse_qs(parsed.query).get("clip", [""])[0]
+        return slug or ""
+    if parsed.netloc.endswith("twitch.tv"):
+        parts = [p for p in parsed.path.split("/") if p]
+        for i, p in enumerate(parts):
+            if p.lower() == "clip" and i + 1 < len(parts):
+                return parts[i + 1]
+        qs = parse_qs(parsed.query)
+        for k in ("clip", "slug", "id"):
+            if k in qs and qs[k]:
+                return qs[k][0]
+    m = _SLUG_RE.search(url)
+    if m:
+        return m.group(1)
+    return ""
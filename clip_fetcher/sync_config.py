@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from .slugs import get_clip_id
+
+# Prefer stdlib tomllib; fall back to 'toml' if needed (older Python)
+try:
+    import tomllib  # Python 3.11+
+except ModuleNotFoundError:
+    tomllib = None
+    import toml
+
+# How config.toml refers to a clip
+EMBED_URL = "https://clips.twitch.tv/embed?clip={slug}"
+
+# config.toml keeps one clip per line, so edits are done line by line: that
+# leaves comments, commented-out clips and formatting exactly as they were
+_SECTION_RE = re.compile(r"^\s*\[categories\.([^\]\s]+)\]\s*$")
+_CLIPS_RE   = re.compile(r"^\s*clips\s*=\s*\[\s*$")
+_ENTRY_RE   = re.compile(r'^(\s*)(#\s*)?\{\s*url\s*=\s*"([^"]+)"')
+_CLOSE_RE   = re.compile(r"^\s*\]\s*$")
+
+
+class ConfigCategory:
+    __slots__ = ("id", "close_line", "indent", "entries")
+
+    def __init__(self, category_id):
+        self.id = category_id
+        self.close_line = None   # index of the line closing the clips array
+        self.indent = "    "
+        self.entries = {}        # slug -> (line index, commented out)
+
+
+def parse_toml(text: str) -> dict:
+    # The one config.toml parser; the app's catalog uses it too
+    if tomllib is not None:
+        return tomllib.loads(text)
+    return toml.loads(text)
+
+
+def scan_layout(lines: List[str]) -> Dict[str, ConfigCategory]:
+    layout = {}
+    category, in_clips = None, False
+    for i, line in enumerate(lines):
+        m = _SECTION_RE.match(line)
+        if m:
+            category, in_clips = layout.setdefault(m.group(1), ConfigCategory(m.group(1))), False
+            continue
+        if category is None:
+            continue
+        if _CLIPS_RE.match(line):
+            in_clips = True
+        elif in_clips and _CLOSE_RE.match(line):
+            category.close_line, in_clips = i, False
+        elif in_clips:
+            m = _ENTRY_RE.match(line)
+            if m:
+                category.entries.setdefault(get_clip_id(m.group(3)) or m.group(3), (i, bool(m.group(2))))
+                if not m.group(2):
+                    category.indent = m.group(1)
+    return layout
+
+
+def config_categories(text: str) -> Dict[str, List[str]]:
+    # The clips config.toml itself lists, per category id: --update-config
+    # without inputs backfills these (e.g. thumbnails for the whole file)
+    config = parse_toml(text).get("categories", {})
+    return {category_id: [c["url"] for c in raw.get("clips", [])] for category_id, raw in config.items()}
+
+
+def needs_metadata(clip: dict) -> bool:
+    # An empty title is a real value (Twitch allows untitled clips); a missing
+    # key or an unknown creator is not. Clips without a thumbnail key show a
+    # blank facade on the watch page, so they are looked up again too; an
+    # empty thumbnail means Twitch had none, and clip_line() writes that.
+    return "title" not in clip or not clip.get("creator") or "thumbnail" not in clip
+
+
+def resolve_category(name: str, slugs: List[str], layout: Dict[str, ConfigCategory]) -> Optional[str]:
+    # CLIP_CATEGORIES names are usually config ids in other case ("Rage_Moment"
+    # -> rage_moment). Otherwise pick the config category that already holds
+    # most of the list's clips ("Lost_Moment" -> lost_fail_moment).
+    if name.lower() in layout:
+        return name.lower()
+    overlap = {cid: sum(1 for s in slugs if s in c.entries) for cid, c in layout.items()}
+    best = max(overlap, key=overlap.get, default=None)
+    return best if best and overlap[best] else None
+
+
+class Change:
+    __slots__ = ("category", "slug", "line", "category_name", "existing")
+
+    def __init__(self, category, slug, line=None, category_name=None, existing=None):
+        self.category = category
+        self.slug = slug
+        self.line = line                    # None: a new clip to append
+        self.category_name = category_name  # set for categories config.toml lacks
+        self.existing = existing or {}      # the clip's current entry, for lines to fill in
+
+
+def plan_update(categories: Dict[str, List[str]], text: str) -> List[Change]:
+    # Clips from CLIP_CATEGORIES that config.toml lacks, or has without title,
+    # creator or thumbnail. Commented-out clips count as known: they were taken out on
+    # purpose and must not come back.
+    config = parse_toml(text).get("categories", {})
+    layout = scan_layout(text.splitlines())
+    changes, planned = [], set()
+    for name, urls in categories.items():
+        slugs = [get_clip_id(u) or u for u in urls]
+        category_id = resolve_category(name, slugs, layout)
+        if category_id is None:
+            changes.extend(Change(name.lower(), s, category_name=name.replace("_", " "))
+                           for s in dict.fromkeys(slugs))
+            continue
+        known = {get_clip_id(c["url"]) or c["url"]: c for c in config.get(category_id, {}).get("clips", [])}
+        for slug in slugs:
+            if (category_id, slug) in planned:
+                continue
+            planned.add((category_id, slug))
+            entry = layout[category_id].entries.get(slug)
+            if entry is None:
+                changes.append(Change(category_id, slug))
+            elif not entry[1] and slug in known and needs_metadata(known[slug]):
+                changes.append(Change(category_id, slug, line=entry[0], existing=known[slug]))
+    return changes
+
+
+def clip_line(indent: str, slug: str, info: dict) -> str:
+    # json.dumps output is a valid TOML basic string. A clip that was resolved
+    # without a thumbnail gets thumbnail = "", so the next --update-config
+    # doesn't look it up again; one that wasn't resolved gets no key. Duration
+    # is left out when unknown. The app shows a plain facade without a thumbnail.
+    fields = [f'url = {json.dumps(EMBED_URL.format(slug=slug), ensure_ascii=False)}',
+              f'title = {json.dumps(info.get("title") or "", ensure_ascii=False)}',
+              f'creator = {json.dumps(info.get("creator") or "", ensure_ascii=False)}']
+    if info.get("thumbnail") or info.get("title") or info.get("creator"):
+        fields.append(f'thumbnail = {json.dumps(info.get("thumbnail") or "", ensure_ascii=False)}')
+    if info.get("duration"):
+        fields.append(f'duration = {round(float(info["duration"]), 1)}')
+    return f'{indent}{{ {", ".join(fields)} }},'
+
+
+def fill_in(existing: dict, info: dict) -> dict:
+    # Title and creator already in config.toml were possibly edited by hand
+    # and win over Twitch's; the rest comes from the lookup when it found it
+    merged = dict(info)
+    if "title" in existing:
+        merged["title"] = existing["title"]
+    if existing.get("creator"):
+        merged["creator"] = existing["creator"]
+    for field in ("thumbnail", "duration"):
+        if not merged.get(field) and existing.get(field):
+            merged[field] = existing[field]
+    return merged
+
+
+def _entry_end(line: str) -> int:
+    # Index just past the "}" closing the line's inline table, skipping braces
+    # inside strings; -1 if it doesn't close on this line
+    depth, quote, i = 0, None, 0
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            if ch == "\\" and quote == '"':
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "#":
+            return -1
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return -1
+
+
+def _trailer(line: str) -> str:
+    # What follows the entry and its comma, usually an inline comment
+    end = _entry_end(line)
+    if end == -1:
+        return ""
+    rest = line[end:]
+    stripped = rest.lstrip()
+    if stripped.startswith(","):
+        rest = stripped[1:]
+    return rest.rstrip()
+
+
+def _with_comma(line: str) -> str:
+    # TOML arrays allow a trailing comma, so every entry can just have one
+    end = _entry_end(line)
+    if end == -1 or line[end:].lstrip().startswith(","):
+        return line
+    return line[:end] + "," + line[end:]
+
+
+def apply_update(text: str, changes: List[Change], infos: Dict[str, dict]) -> Tuple[str, int]:
+    # New config.toml text and the number of clips that were added or filled in
+    lines = text.splitlines()
+    layout = scan_layout(lines)
+    applied = 0
+    appends: Dict[str, List[Change]] = {}
+    new_sections: Dict[str, List[Change]] = {}
+    for change in changes:
+        info = infos.get(change.slug) or {}
+        if change.line is not None:
+            if info.get("title") or info.get("creator") or info.get("thumbnail"):
+                line = clip_line(layout[change.category].indent, change.slug, fill_in(change.existing, info))
+                # Keep an inline comment after the entry
+                line += _trailer(lines[change.line])
+                if line != lines[change.line]:
+                    lines[change.line] = line
+                    applied += 1
+        elif change.category in layout and layout[change.category].close_line is not None:
+            appends.setdefault(change.category, []).append(change)
+        else:
+            new_sections.setdefault(change.category, []).append(change)
+
+    # Bottom-up, so inserting lines does not move the ones still to be edited
+    for category_id in sorted(appends, key=lambda c: layout[c].close_line, reverse=True):
+        category = layout[category_id]
+        close = category.close_line
+        for i in range(close - 1, -1, -1):
+            if _CLIPS_RE.match(lines[i]):
+                break
+            m = _ENTRY_RE.match(lines[i])
+            if m and not m.group(2):
+                lines[i] = _with_comma(lines[i])
+                break
+        added = [clip_line(category.indent, c.slug, infos.get(c.slug) or {}) for c in appends[category_id]]
+        lines[close:close] = added
+        applied += len(added)
+
+    for category_id, category_changes in new_sections.items():
+        lines += ["", f"[categories.{category_id}]",
+                  f"name = {json.dumps(category_changes[0].category_name, ensure_ascii=False)}", "clips = ["]
+        lines += [clip_line("    ", c.slug, infos.get(c.slug) or {}) for c in category_changes]
+        lines.append("]")
+        applied += len(category_changes)
+    return "\n".join(lines) + "\n", applied
+
+
+def write_atomic(path: str, text: str):
+    # The app reloads config.toml when it changes; it must never see half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".config.", suffix=".toml")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
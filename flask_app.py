@@ -1,53 +1,313 @@
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, abort, g, get_template_attribute, send_from_directory, stream_with_context
 import os
+import atexit
+import hashlib
+import hmac
 import json
+import mimetypes
 from functools import wraps
 
-# Prefer stdlib tomllib; fall back to 'toml' if needed (older Python)
-try:
-    import tomllib  # Python 3.11+
-    _USE_TOMLLIB = True
-except ModuleNotFoundError:
-    import toml      # pip install toml
-    _USE_TOMLLIB = False
+import click
+from flask.cli import AppGroup
+
+import analytics
+import assets
+from catalog import CatalogSource, load_catalog
+from chat_votes import collect_chat_votes
+from live_results import ResultsBroadcaster
+from render_cache import RenderCache
+from request_timing import RequestTiming
+from vote_store import open_store, iter_votes_json, normalize_name, votes_to_slugs, write_votes_json
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+
+def load_secret_key():
+    # Sessions have to survive restarts and be valid in every worker, so the key
+    # comes from SECRET_KEY or a file that the first worker creates
+    if os.environ.get("SECRET_KEY"):
+        return os.environ["SECRET_KEY"]
+    path = Path(app.instance_path) / "secret_key"
+    if path.exists():
+        return path.read_bytes()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".secret_key.{os.getpid()}")
+    tmp_path.write_bytes(os.urandom(32))
+    try:
+        # link() fails if another worker won the race; then use its key
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        tmp_path.unlink()
+    return path.read_bytes()
+
+app.secret_key = load_secret_key()
 
 # Load config (absolute path, works on PythonAnywhere)
 BASE_DIR = Path(__file__).resolve().parent
-CONFIG_PATH = BASE_DIR / "config.toml"
-VOTES_PATH = BASE_DIR / "votes.json"
+CONFIG_PATH = Path(os.environ.get("CONFIG_PATH", BASE_DIR / "config.toml"))
+VOTES_PATH = Path(os.environ.get("VOTES_PATH", BASE_DIR / "votes.json"))
+VOTES_LOG_PATH = Path(os.environ.get("VOTES_LOG_PATH", BASE_DIR / "votes.log"))
+VOTES_DB_PATH = Path(os.environ.get("VOTES_DB_PATH", BASE_DIR / "votes.db"))
+# Output of `flask assets build`; without it templates fall back to static/ and the CDN
+ASSETS_DIR = BASE_DIR / "static" / "dist"
+# "sqlite" (default) works with several Gunicorn workers, "log" needs a single worker
+VOTE_BACKEND = os.environ.get("VOTE_BACKEND", "sqlite")
+# REQUEST_TIMING=1 adds Server-Timing headers, /metrics and the request profiler
+REQUEST_TIMING = os.environ.get("REQUEST_TIMING") == "1"
+# Bearer token for the /admin routes; they answer 404 without one
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 
-if _USE_TOMLLIB:
-    with open(CONFIG_PATH, "rb") as f:
-        config = tomllib.load(f)
-else:
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-        config = toml.load(f)
+# Registered before every other request hook, so it times them too
+timing = RequestTiming(app, enabled=REQUEST_TIMING)
+
+
+# Categories and clips, indexed once per version of config.toml and reloaded
+# when the file changes; routes only read from this
+catalog_source = CatalogSource(CONFIG_PATH)
 
 # --- Vote Data Functions ---
-def get_all_votes():
-    if not VOTES_PATH.exists():
-        return {}
-    with open(VOTES_PATH, "r") as f:
-        return json.load(f)
+# votes.json stays the import/export format; a fresh votes.db is seeded from it,
+# with index-based votes mapped to slugs through the current config.toml
+votes_store = open_store(VOTE_BACKEND, VOTES_PATH, db_path=VOTES_DB_PATH, log_path=VOTES_LOG_PATH,
+                         catalog=catalog_source.get())
+atexit.register(votes_store.close)
+results_broadcaster = ResultsBroadcaster(votes_store)
 
-def save_all_votes(votes):
-    with open(VOTES_PATH, "w") as f:
-        json.dump(votes, f, indent=4)
+def get_catalog():
+    # At most one stat() of config.toml per request; the whole request then
+    # sees the same catalog version
+    if "catalog" not in g:
+        with timing.phase("catalog"):
+            g.catalog = catalog_source.get()
+    return g.catalog
+
+@app.before_request
+def load_catalog_for_request():
+    # Pick up config.toml changes before the request reads anything
+    get_catalog()
+
+def get_all_votes():
+    with timing.phase("votes_read"):
+        return votes_store.get_all_votes()
 
 def record_vote(twitch_name, category_id, clip_id):
-    votes = get_all_votes()
-    if twitch_name not in votes:
-        votes[twitch_name] = {}
-    votes[twitch_name][category_id] = clip_id
-    save_all_votes(votes)
+    # normalize_name() again: sessions from before login did it hold the name as typed
+    with timing.phase("votes_write"):
+        votes_store.record_vote(normalize_name(twitch_name), category_id, clip_id)
 
 def get_user_votes(twitch_name):
-    votes = get_all_votes()
-    return votes.get(twitch_name, {})
+    with timing.phase("votes_read"):
+        return votes_store.get_user_votes(normalize_name(twitch_name))
+
+def get_results():
+    # Per-category standings from the incrementally maintained tallies;
+    # costs O(categories x clips) no matter how many people voted
+    with timing.phase("votes_read"):
+        tallies = votes_store.get_tallies()
+    results = []
+    for category in get_catalog().ordered:
+        counts = tallies.get(category.id, {})
+        clips = [
+            {"index": clip.index, "slug": clip.slug, "title": clip.title, "creator": clip.creator,
+             "votes": counts.get(clip.slug, 0)}
+            for clip in category.clips
+        ]
+        results.append({
+            "id": category.id,
+            "name": category.name,
+            "total": sum(c["votes"] for c in clips),
+            "clips": clips,
+        })
+    return results
+
+_analytics_cache = {}
+
+def get_analytics():
+    # Full-matrix report; rebuilt only when a vote or config.toml changed
+    catalog = get_catalog()
+    key = (votes_store.get_version(), catalog.version)
+    report = _analytics_cache.get(key)
+    if report is None:
+        report = analytics.build_report(get_all_votes(), catalog)
+        _analytics_cache.clear()
+        _analytics_cache[key] = report
+    return report
+
+# --- Vote CLI (flask votes ...) ---
+votes_cli = AppGroup("votes", help="Import, export and compact the vote store.")
+app.cli.add_command(votes_cli)
+
+@votes_cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False))
+def export_votes(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_all_votes(), f, indent=4, ensure_ascii=False)
+    click.echo(f"Exported votes to {path}")
+
+@votes_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_votes(path):
+    unmapped = []
+    with open(path, "r", encoding="utf-8") as f:
+        votes = dict(votes_to_slugs(iter_votes_json(f), get_catalog(), unmapped))
+    votes_store.import_votes(votes)
+    click.echo(f"Imported votes from {len(votes)} voters")
+    if unmapped:
+        click.echo(f"{len(unmapped)} votes refer to clip indexes that are not in config.toml", err=True)
+
+@votes_cli.command("migrate-slugs")
+@click.argument("src", type=click.Path(exists=True, dir_okay=False))
+@click.argument("dst", type=click.Path(dir_okay=False), required=False)
+@click.option("--config", "config_path", type=click.Path(exists=True, dir_okay=False),
+              help="config.toml the clip indexes in SRC refer to (default: the current one)")
+def migrate_slugs(src, dst, config_path):
+    """Rewrite an index-based votes.json to clip slugs, streaming voter by voter."""
+    catalog = load_catalog(config_path) if config_path else get_catalog()
+    dst = Path(dst or src)
+    tmp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    unmapped = []
+    with open(src, "r", encoding="utf-8") as f_in, open(tmp_path, "w", encoding="utf-8") as f_out:
+        write_votes_json(f_out, votes_to_slugs(iter_votes_json(f_in), catalog, unmapped))
+    os.replace(tmp_path, dst)
+    click.echo(f"Wrote slug-keyed votes to {dst}")
+    for twitch_name, category_id, clip_index in unmapped:
+        click.echo(f"  no clip {clip_index} in {category_id!r} (vote by {twitch_name!r}), kept as is", err=True)
+
+@votes_cli.command("import-chat")
+@click.argument("logs", nargs=-1, required=True, type=click.File("r", encoding="utf-8", errors="replace"))
+@click.option("--dry-run", is_flag=True, help="parse and count, but don't store anything")
+def import_chat_votes(logs, dry_run):
+    """Store "!vote <category> <clip number>" messages from chat logs ('-' for stdin).
+
+    Logs are streamed line by line; each voter's last vote per category wins
+    and everything is committed as one batch.
+    """
+    catalog = get_catalog()
+    votes, stats = {}, None
+    for f in logs:
+        votes, stats = collect_chat_votes(f, catalog, votes, stats)
+    click.echo(f"{stats.lines} lines, {stats.votes} votes from {len(votes)} voters")
+    if stats.unknown_category or stats.unknown_clip:
+        click.echo(f"Skipped {stats.unknown_category} votes for unknown categories and "
+                   f"{stats.unknown_clip} for clip numbers not in config.toml", err=True)
+    if dry_run or not votes:
+        return
+    votes_store.import_votes(votes)
+    click.echo(f"Imported chat votes from {len(votes)} voters")
+
+@votes_cli.command("analytics")
+@click.option("--votes", "votes_path", type=click.Path(exists=True, dir_okay=False),
+              help="analyse this votes.json instead of the vote store")
+@click.option("--json", "as_json", is_flag=True, help="print the full report as JSON")
+def votes_analytics(votes_path, as_json):
+    """Vote shares, voter overlap and alternative tallies."""
+    catalog = get_catalog()
+    if votes_path:
+        with open(votes_path, "r", encoding="utf-8") as f:
+            votes = dict(votes_to_slugs(iter_votes_json(f), catalog, []))
+    else:
+        votes = get_all_votes()
+    try:
+        report = analytics.build_report(votes, catalog)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    if as_json:
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    click.echo(f"{report['voters']} voters, {report['complete_voters']} voted in every category")
+    for category in report["categories"]:
+        click.echo(f"\n{category['name']} ({category['voters']} votes)")
+        for clip in sorted(category["clips"], key=lambda c: -c["votes"]):
+            click.echo(f"  {clip['votes']:6d} {clip['share']:6.1%}  {clip['complete_voter_votes']:6d}  "
+                       f"{clip['title'] or 'Ohne Titel'} - {clip['creator']}")
+    click.echo("\nCreators (Borda / approval / votes)")
+    for creator in report["creators"]:
+        click.echo(f"  {creator['borda']:4d} {creator['approval']:6d} {creator['votes']:6d}  {creator['creator']}")
+    if report["unmapped_votes"]:
+        click.echo(f"{report['unmapped_votes']} votes are for clips not in config.toml", err=True)
+
+@votes_cli.command("compact")
+def compact_votes():
+    votes_store.compact()
+    click.echo(f"Compacted the {VOTE_BACKEND} vote store")
+
+# --- Rendered page cache ---
+# vote.html and watch.html only depend on the catalog, the clip and the parent
+# domain, so they are rendered once per combination and revalidated via ETag
+render_cache = RenderCache()
+
+def cached_page(key, render):
+    def render_with_etag():
+        body = render().encode("utf-8")
+        return body, hashlib.sha1(body).hexdigest()
+
+    if app.debug:
+        body, etag = render_with_etag()  # pick up template edits immediately
+    else:
+        body, etag = render_cache.get_or_render(key + (get_catalog().version,), render_with_etag)
+    response = Response(body, mimetype="text/html")
+    response.set_etag(etag)
+    # Browsers may keep the page but must ask before reusing it; that answer
+    # is a 304 as long as nothing changed
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+def category_links(catalog):
+    # {category_id: (todo link, voted link)} for home.html, rendered once per
+    # catalog version; only the per-user split happens per request
+    def render():
+        link = get_template_attribute("home.html", "category_link")
+        return {c.id: (link(c, False), link(c, True)) for c in catalog.ordered}
+
+    if app.debug:
+        return render()
+    return render_cache.get_or_render(("home-links", catalog.version), render)
+
+# --- Static assets ---
+asset_manifest = assets.load_manifest(ASSETS_DIR)
+# Used until `flask assets build` has vendored them
+ASSET_FALLBACKS = {assets.BOOTSTRAP_NAME: assets.BOOTSTRAP_CSS_URL}
+
+@app.template_global()
+def asset_url(name):
+    # Fingerprinted URL from the build manifest, or the plain static file
+    hashed = asset_manifest.get(name)
+    if hashed:
+        return url_for("asset", filename=hashed)
+    if name in ASSET_FALLBACKS:
+        return ASSET_FALLBACKS[name]
+    return url_for("static", filename=name)
+
+@app.route("/assets/<path:filename>")
+def asset(filename):
+    # Fingerprinted names never change content, so they can be cached forever;
+    # serve a precompressed sibling when the client accepts it
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    accepted = request.accept_encodings
+    served, encoding = filename, None
+    for suffix, name in ((".br", "br"), (".gz", "gzip")):
+        if accepted[name] and (ASSETS_DIR / (filename + suffix)).is_file():
+            served, encoding = filename + suffix, name
+            break
+    response = send_from_directory(ASSETS_DIR, served, mimetype=mimetype, max_age=31536000)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+assets_cli = AppGroup("assets", help="Build fingerprinted, precompressed static assets.")
+app.cli.add_command(assets_cli)
+
+@assets_cli.command("build")
+@click.option("--bootstrap", "bootstrap_source", type=click.Path(exists=True, dir_okay=False),
+              help=f"local copy of bootstrap.min.css {assets.BOOTSTRAP_VERSION} instead of downloading it")
+def build_assets(bootstrap_source):
+    manifest = assets.build(BASE_DIR / "static", BASE_DIR / "templates", ASSETS_DIR,
+                            bootstrap_source=bootstrap_source, log=click.echo)
+    click.echo(f"Wrote {len(manifest)} assets to {ASSETS_DIR}; restart the app to pick them up")
 
 # Decorator to check if user is logged in
 def login_required(f):
@@ -58,11 +318,22 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            abort(404)
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
 # Routes
 @app.route("/", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
-        session['twitch_name'] = request.form['twitch_name']
+        session['twitch_name'] = normalize_name(request.form['twitch_name'])
         return redirect(url_for('home'))
     return render_template("login.html")
 
@@ -71,65 +342,118 @@ def login():
 def home():
     twitch_name = session['twitch_name']
     user_votes = get_user_votes(twitch_name)
-    all_categories = config["categories"]
-
-    voted_categories = {k: v for k, v in all_categories.items() if k in user_votes}
-    todo_categories = {k: v for k, v in all_categories.items() if k not in user_votes}
-
-    return render_template("home.html", voted_categories=voted_categories, todo_categories=todo_categories)
+    catalog = get_catalog()
+    links = category_links(catalog)
+    voted_categories, todo_categories = catalog.split_by_votes(user_votes)
+    return render_template("home.html",
+                           voted_links=[links[c.id][1] for c in voted_categories],
+                           todo_links=[links[c.id][0] for c in todo_categories])
 
 @app.route("/watch/<category_id>/<int:clip_index>")
 @login_required
 def watch_clip(category_id, clip_index):
-    category = config["categories"][category_id]
-    clip = category["clips"][clip_index]
-
-    next_clip_index = clip_index + 1
-    if next_clip_index >= len(category["clips"]):
-        next_clip_index = None
-
-    previous_clip_index = clip_index - 1
-    if previous_clip_index < 0:
-        previous_clip_index = None
+    category, clip = get_catalog().get_clip(category_id, clip_index)
+    if clip is None:
+        abort(404)
 
     # Twitch parent = current domain without port
     parent_domain = request.host.split(":")[0]
 
-    # Append parent param to existing embed URL
-    separator = "&" if "?" in clip["url"] else "?"
-    embed_url = f'{clip["url"]}{separator}parent={parent_domain}'
-
-    return render_template(
+    return cached_page(("watch", category_id, clip_index, parent_domain), lambda: render_template(
         "watch.html",
         category_id=category_id,
         category=category,
         clip=clip,
         clip_index=clip_index,
-        next_clip_index=next_clip_index,
-        previous_clip_index=previous_clip_index,
-        embed_url=embed_url
-    )
+        next_clip_index=clip.next_index,
+        next_clip=category.get_clip(clip.next_index) if clip.next_index is not None else None,
+        previous_clip_index=clip.previous_index,
+        embed_url=clip.embed_url(parent_domain)
+    ))
 
 @app.route("/vote/<category_id>")
 @login_required
 def vote(category_id):
-    category = config["categories"][category_id]
+    catalog = get_catalog()
+    category = catalog.get_category(category_id)
+    if category is None:
+        abort(404)
     parent_domain = request.host.split(":")[0]
-    return render_template("vote.html", category_id=category_id, category=category, parent_domain=parent_domain)
+    return cached_page(("vote", category_id, parent_domain), lambda: render_template(
+        "vote.html", category_id=category_id, category=category, parent_domain=parent_domain))
 
 @app.route("/vote", methods=["POST"])
 @login_required
 def submit_vote():
     twitch_name = session['twitch_name']
     category_id = request.form.get("category_id")
-    clip_id = int(request.form.get("vote"))
+    # Votes are stored by clip slug, which stays valid when config.toml is edited
+    clip_slug = request.form.get("vote")
+    if not clip_slug:
+        abort(400)
+    category = get_catalog().get_category(category_id)
+    voted_for_clip = category.get_clip_by_slug(clip_slug) if category else None
+    if voted_for_clip is None:
+        abort(404)
 
-    record_vote(twitch_name, category_id, clip_id)
+    record_vote(twitch_name, category_id, voted_for_clip.slug)
 
-    voted_for_clip = config['categories'][category_id]['clips'][clip_id]
-    print(f"Vote received from '{twitch_name}' for category '{category_id}': '{voted_for_clip['title']}'")
+    print(f"Vote received from '{twitch_name}' for category '{category_id}': '{voted_for_clip.title}'")
     return redirect(url_for("home"))
 
+@app.route("/results")
+def results():
+    return render_template("results.html", results=get_results())
+
+@app.route("/api/results")
+def api_results():
+    return jsonify(categories=get_results())
+
+@app.route("/api/results/analytics")
+def api_results_analytics():
+    # Shares, voter overlap, complete-voter winners and creator tallies
+    try:
+        return jsonify(get_analytics())
+    except RuntimeError as e:
+        return jsonify(error=str(e)), 501
+
+@app.route("/api/results/stream")
+def api_results_stream():
+    # Server-Sent Events: a "snapshot" event with the full standings, then
+    # "delta" events ({category_id: {clip_slug: new_count}}) batched per 250 ms.
+    # Serve with gunicorn -k gevent so idle listeners don't pin a worker thread.
+    stream = results_broadcaster.stream(lambda: {"categories": get_results()})
+    return Response(stream_with_context(stream), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.route("/metrics")
+def metrics():
+    # Prometheus text format; every worker process reports its own requests
+    if not timing.enabled:
+        abort(404)
+    return Response(timing.metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/profile", methods=["GET", "POST"])
+@admin_required
+def admin_profile():
+    # POST ?requests=N samples the next N requests this worker serves; the
+    # collapsed stacks land in instance/profiles/ and at /admin/profile/latest
+    if not timing.enabled:
+        abort(404)
+    if request.method == "POST":
+        timing.profiler.start(request.args.get("requests", 100, type=int))
+    return jsonify(worker=os.getpid(), **timing.profiler.status())
+
+@app.route("/admin/profile/latest")
+@admin_required
+def admin_profile_latest():
+    path = timing.profiler.last_path if timing.enabled else None
+    if not path:
+        abort(404)
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype="text/plain")
+
 @app.route("/logout")
 def logout():
     session.pop('twitch_name', None)
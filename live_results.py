@@ -0,0 +1,124 @@
+import json
+import queue
+import threading
+import time
+
+# Votes arriving within one window are folded into a single message
+BATCH_INTERVAL = 0.25
+# Comment line sent to idle streams so proxies don't close them
+HEARTBEAT_INTERVAL = 15
+# Messages buffered per listener before it is considered stuck and dropped
+MAX_PENDING = 64
+
+
+class ResultsBroadcaster:
+    # One background thread per worker process watches the vote store and fans
+    # tally changes out to every connected listener. Each tick costs one cheap
+    # version check; the tallies are only re-read and diffed when it changed,
+    # which also picks up votes recorded by other worker processes.
+    #
+    # Only threading/queue primitives are used, so under gevent's monkey
+    # patching (gunicorn -k gevent) listeners are greenlets, not OS threads.
+
+    def __init__(self, store, interval=BATCH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._version = None
+        self._tallies = {}
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=MAX_PENDING)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="results-broadcaster", daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def listener_count(self):
+        return len(self._subscribers)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._subscribers:
+                continue
+            try:
+                delta = self._poll()
+            except Exception as e:
+                print(f"Results broadcaster poll failed: {e}")
+                continue
+            if delta:
+                self._publish(delta)
+
+    def _poll(self):
+        version = self.store.get_version()
+        if version == self._version:
+            return None
+        self._version = version
+        tallies = self.store.get_tallies()
+        delta = {}
+        for category_id in tallies.keys() | self._tallies.keys():
+            new = tallies.get(category_id, {})
+            old = self._tallies.get(category_id, {})
+            changed = {clip_id: new.get(clip_id, 0)
+                       for clip_id in new.keys() | old.keys()
+                       if new.get(clip_id, 0) != old.get(clip_id, 0)}
+            if changed:
+                delta[category_id] = changed
+        self._tallies = tallies
+        return delta
+
+    def _publish(self, delta):
+        message = format_event("delta", delta)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # The client stopped reading. Drop it; EventSource reconnects
+                # and starts over from a fresh snapshot
+                self.unsubscribe(q)
+                _drain(q)
+                q.put_nowait(None)
+
+    def stream(self, snapshot):
+        # Generator for one text/event-stream response: the full standings
+        # first, then a message per batch of changed clip counts. snapshot()
+        # is called after subscribing, so a delta published in between is
+        # queued rather than lost; deltas carry absolute counts, so one the
+        # snapshot already includes does no harm.
+        q = self.subscribe()
+        try:
+            yield format_event("snapshot", snapshot())
+            while True:
+                try:
+                    message = q.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(q)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _drain(q):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
@@ -0,0 +1,38 @@
+import threading
+from collections import OrderedDict
+
+# Upper bound on cached entries; the parent domain comes from the Host header,
+# so the key space is not fully under our control
+MAX_ENTRIES = 512
+
+
+class RenderCache:
+    # Bounded LRU for rendered output. Keys include the catalog version, so a
+    # config.toml reload simply stops hitting the old entries and they age out.
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        # Render outside the lock; two threads racing on a miss both produce
+        # the same output, which is cheaper than serializing every miss
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,233 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from flask import g, request, template_rendered, before_render_template
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Seconds between stack samples while the profiler runs
+SAMPLE_INTERVAL = 0.002
+# Upper bound for one profiling run, so a typo can't leave it on all night
+MAX_PROFILED_REQUESTS = 10000
+
+_NOT_TIMED = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("phases", "name", "t0")
+
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.t0
+        return False
+
+
+class RouteMetrics:
+    # Latency histograms per (route, method, status) and time per phase, both
+    # cumulative since the worker started, as Prometheus expects; rates and
+    # windows are computed at query time. Each worker process keeps its own.
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}   # (route, method, status) -> [bucket counts..., +Inf count, sum]
+        self._phases = {}     # (route, phase) -> [seconds, count]
+
+    def observe(self, route, method, status, seconds, phases):
+        with self._lock:
+            entry = self._requests.get((route, method, status))
+            if entry is None:
+                entry = self._requests[(route, method, status)] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[i] += 1
+                    break
+            else:
+                entry[len(self.buckets)] += 1
+            entry[-1] += seconds
+            for name, spent in phases.items():
+                totals = self._phases.setdefault((route, name), [0.0, 0])
+                totals[0] += spent
+                totals[1] += 1
+
+    def prometheus(self):
+        # Text exposition format 0.0.4
+        with self._lock:
+            requests = {key: list(entry) for key, entry in self._requests.items()}
+            phases = {key: list(totals) for key, totals in self._phases.items()}
+        lines = [
+            "# HELP cherry_request_duration_seconds Time from request start to response, per route.",
+            "# TYPE cherry_request_duration_seconds histogram",
+        ]
+        for (route, method, status), entry in sorted(requests.items()):
+            labels = f'route="{route}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry):
+                cumulative += count
+                lines.append(f'cherry_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"cherry_request_duration_seconds_sum{{{labels}}} {entry[-1]:.6f}")
+            lines.append(f"cherry_request_duration_seconds_count{{{labels}}} {cumulative}")
+        lines += [
+            "# HELP cherry_request_phase_seconds_total Time spent in each phase of request handling.",
+            "# TYPE cherry_request_phase_seconds_total counter",
+        ]
+        lines += [f'cherry_request_phase_seconds_total{{route="{route}",phase="{name}"}} {totals[0]:.6f}'
+                  for (route, name), totals in sorted(phases.items())]
+        lines += [
+            "# HELP cherry_request_phase_total Requests that went through each phase.",
+            "# TYPE cherry_request_phase_total counter",
+        ]
+        lines += [f'cherry_request_phase_total{{route="{route}",phase="{name}"}} {totals[1]}'
+                  for (route, name), totals in sorted(phases.items())]
+        return "\n".join(lines) + "\n"
+
+
+def _folded_stack(frame):
+    # "outermost;...;innermost", one frame as "function (file:line)"
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    # Samples the stacks of the threads serving the next N requests from a
+    # background thread. The output is collapsed stacks ("a;b;c 12" per line),
+    # which flamegraph.pl, speedscope and inferno read as is. Samples come from
+    # sys._current_frames(), so it sees OS threads: profile with sync or
+    # gthread workers, not gevent. The sampler needs the GIL to take a sample,
+    # so code that releases it (file and socket I/O) is somewhat overcounted.
+
+    def __init__(self, output_dir, interval=SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._threads = set()
+        self._samples = Counter()
+        self._sampler = None
+        self.last_path = None
+
+    def start(self, requests):
+        with self._lock:
+            self._remaining = max(1, min(requests, MAX_PROFILED_REQUESTS))
+            self._samples = Counter()
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._sampler.start()
+            return self._remaining
+
+    def status(self):
+        return {"remaining": self._remaining, "active": len(self._threads), "last_profile": self.last_path}
+
+    def enter(self):
+        # Called for every request; True if this one is sampled
+        if not self._remaining:
+            return False
+        with self._lock:
+            if not self._remaining:
+                return False
+            self._remaining -= 1
+            self._threads.add(threading.get_ident())
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+            if self._remaining or self._threads:
+                return
+            samples, self._samples = self._samples, Counter()
+            self._sampler = None
+        self._dump(samples)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._sampler is not threading.current_thread():
+                    return
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            stacks = [_folded_stack(frames[ident]) for ident in threads if ident in frames]
+            with self._lock:
+                self._samples.update(stacks)
+
+    def _dump(self, samples):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last_path = path
+        print(f"Wrote {sum(samples.values())} profile samples to {path}")
+
+
+class RequestTiming:
+    # Per-request phase timings (Server-Timing header), route histograms and
+    # the profiler. Disabled, phase() hands out one shared null context and no
+    # request hooks are installed, so the app pays a function call per phase.
+
+    def __init__(self, app=None, enabled=False, profile_dir=None):
+        self.enabled = enabled
+        self.metrics = RouteMetrics()
+        self.profiler = None
+        if app is not None:
+            self.init_app(app, profile_dir)
+
+    def init_app(self, app, profile_dir=None):
+        if not self.enabled:
+            return
+        self.profiler = SamplingProfiler(profile_dir or os.path.join(app.instance_path, "profiles"))
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+    def phase(self, name):
+        # with timing.phase("votes_read"): ...; repeated phases add up
+        if not self.enabled:
+            return _NOT_TIMED
+        phases = g.get("timing_phases")
+        return _NOT_TIMED if phases is None else _Phase(phases, name)
+
+    def _before(self):
+        g.timing_start = time.perf_counter()
+        g.timing_phases = {}
+        g.timing_profiled = self.profiler.enter()
+
+    def _render_started(self, sender, template, context, **extra):
+        g.timing_render_start = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        start = g.pop("timing_render_start", None)
+        phases = g.get("timing_phases")
+        if start is not None and phases is not None:
+            phases["render"] = phases.get("render", 0.0) + time.perf_counter() - start
+
+    def _after(self, response):
+        start = g.get("timing_start")
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        phases = g.timing_phases
+        response.headers["Server-Timing"] = ", ".join(
+            [f"{name};dur={spent * 1000:.2f}" for name, spent in phases.items()] + [f"total;dur={total * 1000:.2f}"])
+        self.metrics.observe(request.endpoint or "unmatched", request.method, response.status_code, total, phases)
+        return response
+
+    def _teardown(self, exc):
+        if g.pop("timing_profiled", False):
+            self.profiler.leave()
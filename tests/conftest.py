@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# flask_app reads its paths from the environment at import time, so point it
+# at a throwaway config and vote store before any test imports it
+TMP = Path(tempfile.mkdtemp(prefix="cherry-voting-tests-"))
+CONFIG = """\
+[categories]
+
+[categories.funniest_moment]
+name = "Funniest Moment"
+clips = [
+    { url = "https://clips.twitch.tv/embed?clip=FunnyClipOne-aaaa", title = "one", creator = "Apulxd" },
+    { url = "https://clips.twitch.tv/embed?clip=FunnyClipTwo-bbbb", title = "two", creator = "Ov3r_cs" },
+]
+
+[categories.rage_moment]
+name = "Rage Moment"
+clips = [
+    { url = "https://clips.twitch.tv/embed?clip=RageClipOne-cccc", title = "three", creator = "cherryylein" },
+]
+"""
+(TMP / "config.toml").write_text(CONFIG, encoding="utf-8")
+os.environ.update(
+    CONFIG_PATH=str(TMP / "config.toml"),
+    VOTES_PATH=str(TMP / "votes.json"),
+    VOTES_LOG_PATH=str(TMP / "votes.log"),
+    VOTES_DB_PATH=str(TMP / "votes.db"),
+    SECRET_KEY="tests",
+)
+os.environ.pop("VOTE_BACKEND", None)
+
+
+@pytest.fixture
+def tmp_config():
+    return TMP / "config.toml"
+
+
+@pytest.fixture
+def app_module():
+    import flask_app
+    return flask_app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
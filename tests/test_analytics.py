@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+
+def vote(client, twitch_name, category_id, slug):
+    client.post("/", data={"twitch_name": twitch_name})
+    response = client.post("/vote", data={"category_id": category_id, "vote": slug})
+    assert response.status_code in (302, 303)
+
+
+def test_analytics_follow_new_votes(client):
+    before = client.get("/api/results/analytics").get_json()
+    vote(client, "analytics_voter", "funniest_moment", "FunnyClipTwo-bbbb")
+    after = client.get("/api/results/analytics").get_json()
+    assert after["voters"] == before["voters"] + 1
+    clips = {c["slug"]: c["votes"] for c in after["categories"][0]["clips"]}
+    before_clips = {c["slug"]: c["votes"] for c in before["categories"][0]["clips"]}
+    assert clips["FunnyClipTwo-bbbb"] == before_clips["FunnyClipTwo-bbbb"] + 1
+
+
+def test_store_version_changes_on_own_writes(app_module):
+    store = app_module.votes_store
+    version = store.get_version()
+    store.record_vote("version_voter", "rage_moment", "RageClipOne-cccc")
+    assert store.get_version() > version
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import assets
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def build(out_dir, bootstrap):
+    return assets.build(ROOT / "static", ROOT / "templates", out_dir, bootstrap_source=bootstrap,
+                        log=lambda *a: None)
+
+
+def test_build_keeps_previous_build_and_prunes_older(tmp_path):
+    out_dir = tmp_path / "dist"
+    bootstrap = tmp_path / "bootstrap.min.css"
+    names = []
+    for color in ("red", "green", "blue"):
+        bootstrap.write_text(f".container{{color:{color}}}", encoding="utf-8")
+        names.append(build(out_dir, bootstrap)[assets.BOOTSTRAP_NAME])
+
+    assert len(set(names)) == 3
+    assert assets.load_manifest(out_dir)[assets.BOOTSTRAP_NAME] == names[2]
+    # The build before still serves pages rendered against its manifest
+    assert (out_dir / names[1]).is_file()
+    assert (out_dir / f"{names[1]}.gz").is_file()
+    assert not (out_dir / names[0]).exists()
+    assert not (out_dir / f"{names[0]}.gz").exists()
+    assert not list(out_dir.rglob("*.tmp"))
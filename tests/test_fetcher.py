@@ -0,0 +1,115 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from clip_fetcher import fetcher  # noqa: E402
+from clip_fetcher.metadata_cache import MetadataCache  # noqa: E402
+from clip_fetcher.resolve import resolve_clips  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from twitch_stub import TwitchStub  # noqa: E402
+
+
+@pytest.fixture
+def twitch_stub():
+    # The stub on its own event loop in a thread, so blocking entry points
+    # like resolve_clips() can run their own loops against it
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    stub = TwitchStub(latency=0.05)
+    asyncio.run_coroutine_threadsafe(stub.__aenter__(), loop).result(10)
+    try:
+        yield stub
+    finally:
+        asyncio.run_coroutine_threadsafe(stub.__aexit__(None, None, None), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(10)
+        loop.close()
+
+
+def test_resolve_clips_twice_in_one_process(twitch_stub, monkeypatch):
+    # One clip per GraphQL request and one request per host at a time, so
+    # requests queue for their slot in both runs
+    monkeypatch.setattr(fetcher, "GQL_URL", twitch_stub.gql_url)
+    monkeypatch.setattr(fetcher, "GQL_BATCH_SIZE", 1)
+    monkeypatch.setattr(fetcher, "PER_HOST_LIMIT", 1)
+    urls = [f"https://clips.twitch.tv/StubClip{i}-abcd" for i in range(6)]
+    for _ in range(2):
+        clips = resolve_clips(urls, cache_path=None)
+        assert [c.title for c in clips] == [f"Clip StubClip{i}-ab" for i in range(6)]
+
+
+def fake_twitch(gql_answers, pages_load=True):
+    # Stands in for fetch_with_retries. GraphQL answers come from gql_answers
+    # (None: the request gave up); clip pages either load without metadata
+    # or give up too.
+    async def fetch(session, method, url, *, json_body=None, parser_factory=None, **kwargs):
+        if method == "POST":
+            if gql_answers is None:
+                return None
+            return {"data": {f"c{var[1:]}": gql_answers.get(slug) for var, slug in json_body["variables"].items()}}
+        if not pages_load:
+            return None
+        scanner = parser_factory()
+        scanner.feed(b"<html><head><title>Twitch</title></head><body></body></html>")
+        return scanner
+    return fetch
+
+
+def lookup(url, cache):
+    async def run():
+        return await fetcher.cached_scrape_clip(None, url, cache, metrics=None)
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+def test_failed_lookups_are_not_cached(cache, monkeypatch):
+    monkeypatch.setattr(fetcher, "fetch_with_retries", fake_twitch(None, pages_load=False))
+    assert lookup("https://clips.twitch.tv/GoneClip-abcd", cache)["title"] is None
+    assert cache.get("GoneClip-abcd") is None
+
+
+@pytest.mark.parametrize("gql_answers", [{"GoneClip-abcd": None}, None], ids=["gql-null", "empty-page"])
+def test_clips_twitch_reports_missing_are_cached(cache, monkeypatch, gql_answers):
+    monkeypatch.setattr(fetcher, "fetch_with_retries", fake_twitch(gql_answers))
+    assert lookup("https://clips.twitch.tv/GoneClip-abcd", cache)["title"] is None
+    assert cache.get("GoneClip-abcd") == {"title": None, "creator": None, "broadcaster": None,
+                                          "thumbnail": None, "duration": None}
+
+
+def test_json_run_writes_no_files(twitch_stub, monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(fetcher, "GQL_URL", twitch_stub.gql_url)
+    urls = [f"https://clips.twitch.tv/StubClip{i}-abcd" for i in range(3)]
+    asyncio.run(fetcher.run_all({"Funny": urls}, output_dir=str(tmp_path), as_json=True))
+    assert list(tmp_path.iterdir()) == []
+    results = json.loads(capsys.readouterr().out)
+    assert [c["title"] for c in results["Funny"]] == [f"Clip StubClip{i}-ab" for i in range(3)]
+
+
+def test_no_backoff_after_the_last_attempt(twitch_stub, monkeypatch):
+    monkeypatch.setattr(twitch_stub, "error_rate", 1.0)
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            t0 = time.monotonic()
+            body = await fetcher.fetch_with_retries(session, "GET", f"{twitch_stub.base_url}/SomeClip-abcd",
+                                                    retries=1, backoff=5.0, limiter=None, metrics=None)
+            return body, time.monotonic() - t0
+
+    body, elapsed = asyncio.run(run())
+    assert body is None
+    assert elapsed < 2
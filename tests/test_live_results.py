@@ -0,0 +1,34 @@
+from live_results import ResultsBroadcaster
+
+
+class FakeStore:
+    def get_version(self):
+        return 0
+
+    def get_tallies(self):
+        return {}
+
+
+def test_snapshot_is_built_after_subscribing():
+    broadcaster = ResultsBroadcaster(FakeStore(), interval=60)
+    listeners_at_snapshot = []
+
+    def snapshot():
+        listeners_at_snapshot.append(broadcaster.listener_count())
+        return {"categories": []}
+
+    stream = broadcaster.stream(snapshot)
+    assert next(stream).startswith("event: snapshot\n")
+    assert listeners_at_snapshot == [1]
+    stream.close()
+    assert broadcaster.listener_count() == 0
+
+
+def test_stream_route_starts_with_a_snapshot(client):
+    response = client.get("/api/results/stream", buffered=False)
+    try:
+        first = next(response.iter_encoded())
+        assert first.startswith(b"event: snapshot\n")
+        assert b"funniest_moment" in first
+    finally:
+        response.close()
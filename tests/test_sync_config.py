@@ -0,0 +1,56 @@
+from clip_fetcher.sync_config import apply_update, config_categories, parse_toml, plan_update
+
+
+def test_update_without_inputs_backfills_thumbnails_for_every_category(tmp_config):
+    text = tmp_config.read_text(encoding="utf-8")
+    changes = plan_update(config_categories(text), text)
+    assert {c.category for c in changes} == {"funniest_moment", "rage_moment"}
+    infos = {c.slug: {"title": "from twitch", "creator": "someone", "thumbnail": f"https://t/{c.slug}.jpg",
+                      "duration": 12.34} for c in changes}
+    updated, applied = apply_update(text, changes, infos)
+    assert applied == 3
+    clips = [c for raw in parse_toml(updated)["categories"].values() for c in raw["clips"]]
+    assert all(c["thumbnail"].startswith("https://t/") and c["duration"] == 12.3 for c in clips)
+    # Titles and creators already in the file are kept
+    assert [c["title"] for c in clips] == ["one", "two", "three"]
+    assert plan_update(config_categories(updated), updated) == []
+
+
+CONFIG_WITH_COMMENTS = """\
+[categories.funniest_moment]
+name = "Funniest Moment"
+clips = [
+    { url = "https://clips.twitch.tv/embed?clip=FunnyClipOne-aaaa", title = "one }", creator = "Apulxd" },  # keep {me}
+    { url = "https://clips.twitch.tv/embed?clip=FunnyClipTwo-bbbb", title = "two", creator = "Ov3r_cs" } # last
+]
+"""
+
+
+def test_fill_keeps_inline_comments():
+    text = CONFIG_WITH_COMMENTS
+    changes = plan_update(config_categories(text), text)
+    infos = {c.slug: {"title": "x", "creator": "y", "thumbnail": f"https://t/{c.slug}.jpg"} for c in changes}
+    updated, applied = apply_update(text, changes, infos)
+    assert applied == 2
+    lines = updated.splitlines()
+    assert lines[3].endswith('thumbnail = "https://t/FunnyClipOne-aaaa.jpg" },  # keep {me}')
+    assert lines[4].endswith('thumbnail = "https://t/FunnyClipTwo-bbbb.jpg" }, # last')
+    assert [c["title"] for c in parse_toml(updated)["categories"]["funniest_moment"]["clips"]] == ["one }", "two"]
+
+
+def test_clips_without_a_thumbnail_are_not_looked_up_again(tmp_config):
+    text = tmp_config.read_text(encoding="utf-8")
+    changes = plan_update(config_categories(text), text)
+    infos = {c.slug: {"title": "from twitch", "creator": "someone", "thumbnail": None} for c in changes}
+    updated, _ = apply_update(text, changes, infos)
+    clips = [c for raw in parse_toml(updated)["categories"].values() for c in raw["clips"]]
+    assert [c["thumbnail"] for c in clips] == ["", "", ""]
+    assert plan_update(config_categories(updated), updated) == []
+
+
+def test_unresolved_clips_are_retried(tmp_config):
+    text = tmp_config.read_text(encoding="utf-8")
+    categories = {"funniest_moment": ["https://clips.twitch.tv/NewClip-dddd"]}
+    updated, applied = apply_update(text, plan_update(categories, text), {})
+    assert applied == 1
+    assert [c.slug for c in plan_update(categories, updated)] == ["NewClip-dddd"]
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from catalog import load_catalog
+from chat_votes import collect_chat_votes
+from vote_store import LogVoteStore, SqliteVoteStore, open_store
+
+INDEX_VOTES = {"ente_vvs": {"funniest_moment": 1}, "bob": {"funniest_moment": 0, "rage_moment": 0}}
+SLUG_VOTES = {"ente_vvs": {"funniest_moment": "FunnyClipTwo-bbbb"},
+              "bob": {"funniest_moment": "FunnyClipOne-aaaa", "rage_moment": "RageClipOne-cccc"}}
+
+
+@pytest.fixture
+def votes_path(tmp_path):
+    path = tmp_path / "votes.json"
+    path.write_text(json.dumps(INDEX_VOTES), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "log"])
+def test_index_based_votes_json_is_seeded_as_slugs(backend, votes_path, tmp_config):
+    store = open_store(backend, votes_path, catalog=load_catalog(tmp_config))
+    try:
+        assert store.get_all_votes() == SLUG_VOTES
+        assert store.get_tallies()["funniest_moment"] == {"FunnyClipOne-aaaa": 1, "FunnyClipTwo-bbbb": 1}
+    finally:
+        store.close()
+
+
+def test_sqlite_refuses_to_seed_unconvertible_indexes(votes_path, capsys):
+    store = open_store("sqlite", votes_path)
+    try:
+        assert store.is_empty()
+        assert "migrate-slugs" in capsys.readouterr().out
+    finally:
+        store.close()
+
+
+def test_sqlite_warns_about_index_votes_already_stored(tmp_path, capsys):
+    votes_path = tmp_path / "votes.json"
+    store = open_store("sqlite", votes_path)
+    store.import_votes({"ente_vvs": {"funniest_moment": "4"}})
+    store.close()
+    store = open_store("sqlite", votes_path)
+    try:
+        assert store.index_vote_count() == 1
+        assert "flask votes import" in capsys.readouterr().out
+    finally:
+        store.close()
+
+
+def test_web_login_and_chat_votes_are_one_voter(app_module, client):
+    client.post("/", data={"twitch_name": " Case_Voter "})
+    client.post("/vote", data={"category_id": "funniest_moment", "vote": "FunnyClipOne-aaaa"})
+    votes, _ = collect_chat_votes(
+        [":case_voter!case_voter@case_voter.tmi.twitch.tv PRIVMSG #cherryylein :!vote rage_moment 1"],
+        app_module.catalog_source.get())
+    app_module.votes_store.import_votes(votes)
+
+    all_votes = app_module.votes_store.get_all_votes()
+    assert "Case_Voter" not in all_votes
+    assert all_votes["case_voter"] == {"funniest_moment": "FunnyClipOne-aaaa", "rage_moment": "RageClipOne-cccc"}
+
+
+def test_sqlite_migration_merges_voter_name_spellings(tmp_path):
+    db_path = tmp_path / "votes.db"
+    store = SqliteVoteStore(db_path)
+    conn = store._conn()
+    conn.executemany("INSERT INTO votes VALUES (?, ?, ?, ?)", [
+        ("Ente_VVS", "funniest_moment", "FunnyClipOne-aaaa", 1.0),
+        ("Ente_VVS", "rage_moment", "RageClipOne-cccc", 1.0),
+        ("ente_vvs", "funniest_moment", "FunnyClipTwo-bbbb", 2.0),
+    ])
+    conn.execute(f"PRAGMA user_version = {len(SqliteVoteStore.MIGRATIONS) - 1}")
+    version = store.get_version()
+    store.close()
+
+    store = SqliteVoteStore(db_path)
+    try:
+        assert store.get_all_votes() == {
+            "ente_vvs": {"funniest_moment": "FunnyClipTwo-bbbb", "rage_moment": "RageClipOne-cccc"}}
+        assert store.get_tallies() == {"funniest_moment": {"FunnyClipTwo-bbbb": 1},
+                                       "rage_moment": {"RageClipOne-cccc": 1}}
+        assert store.get_version() > version
+    finally:
+        store.close()
+
+
+def test_log_store_lowercases_voter_names_on_load(tmp_path):
+    votes_path = tmp_path / "votes.json"
+    votes_path.write_text(json.dumps({"Ente_VVS": {"funniest_moment": "FunnyClipOne-aaaa"}}), encoding="utf-8")
+    (tmp_path / "votes.log").write_text(
+        json.dumps({"u": "ENTE_vvs", "c": "rage_moment", "v": "RageClipOne-cccc"}) + "\n", encoding="utf-8")
+    store = LogVoteStore(votes_path)
+    store.close()
+    assert json.loads(votes_path.read_text(encoding="utf-8")) == {
+        "ente_vvs": {"funniest_moment": "FunnyClipOne-aaaa", "rage_moment": "RageClipOne-cccc"}}
@@ -0,0 +1,534 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from clip_fetcher.slugs import get_clip_id
+
+# Number of appended votes after which the log is folded into the snapshot
+COMPACT_EVERY = 500
+
+
+def normalize_name(twitch_name):
+    # Twitch logins are case-insensitive: a web login as "Ente_VVS" and chat
+    # votes from ente_vvs are one voter, stored under the lowercase login
+    return twitch_name.strip().lower()
+
+
+def _write_json_atomic(path, data):
+    # Write to a sibling temp file and rename over the target, so readers never
+    # see a truncated or half-written file
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def iter_votes_json(f, chunk_size=1 << 16):
+    # Stream (twitch_name, {category_id: clip_id}) pairs out of a votes.json
+    # file without loading the whole document
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end == len(buf) and not eof:
+                # A number could continue in the next chunk; re-parse once more is read
+                fill()
+                continue
+            pos = end
+            return obj
+
+    fill()
+    skip(" \t\r\n")
+    if buf[pos:pos + 1] != "{":
+        raise ValueError("votes.json must contain a JSON object")
+    pos += 1
+    while True:
+        skip(" \t\r\n,")
+        if buf[pos:pos + 1] == "}" or (eof and pos >= len(buf)):
+            return
+        twitch_name = value()
+        skip(" \t\r\n:")
+        yield twitch_name, value()
+
+
+def votes_to_slugs(voters, catalog, unmapped):
+    # Older votes.json files store the clip's index in config.toml; map those to
+    # the clip slug. Slugs pass through; unknown indexes (all of them without a
+    # catalog) are kept and counted.
+    for twitch_name, user_votes in voters:
+        converted = {}
+        for category_id, clip_id in user_votes.items():
+            if isinstance(clip_id, int):
+                category, clip = catalog.get_clip(category_id, clip_id) if catalog is not None else (None, None)
+                if clip is None:
+                    unmapped.append((twitch_name, category_id, clip_id))
+                else:
+                    clip_id = clip.slug
+            converted[category_id] = clip_id
+        yield twitch_name, converted
+
+
+def _report_unmapped(path, unmapped, action):
+    print(f"{len(unmapped)} votes in {path} refer to clip indexes that config.toml doesn't have; {action}. "
+          f"Convert the file with the config.toml they were cast with: "
+          f"flask votes migrate-slugs {path} --config old-config.toml")
+
+
+def write_votes_json(f, items):
+    # Counterpart of iter_votes_json: same layout as json.dump(..., indent=4),
+    # written one voter at a time
+    f.write("{")
+    first = True
+    for twitch_name, user_votes in items:
+        body = json.dumps(user_votes, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+        f.write(("\n" if first else ",\n") + f"    {json.dumps(twitch_name, ensure_ascii=False)}: {body}")
+        first = False
+    f.write("\n}" if not first else "}")
+
+
+class LogVoteStore:
+    # votes.json is the compacted snapshot ({twitch_name: {category_id: clip_id}}),
+    # votes.log holds one JSON record per vote cast since that snapshot was written.
+    # Reads are served from the in-memory index; a vote costs one appended line.
+    # Per-clip tallies ({category_id: {clip_id: count}}) are kept next to the index.
+    # clip_id is the Twitch clip slug, so edits to config.toml never move votes.
+
+    def __init__(self, snapshot_path, log_path=None, compact_every=COMPACT_EVERY, catalog=None):
+        self.snapshot_path = Path(snapshot_path)
+        # Maps an index-based snapshot to slugs while loading
+        self.catalog = catalog
+        self.log_path = Path(log_path) if log_path else self.snapshot_path.with_suffix(".log")
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._votes = {}
+        self._tallies = {}
+        self._version = 0
+        self._pending = 0
+        self._load()
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def _load(self):
+        if self.snapshot_path.exists():
+            unmapped = []
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                for twitch_name, user_votes in votes_to_slugs(iter_votes_json(f), self.catalog, unmapped):
+                    self._apply_user(twitch_name, user_votes)
+            if unmapped:
+                # Kept as numbers, so the next compaction doesn't lose them
+                _report_unmapped(self.snapshot_path, unmapped, "they are kept as they are and not counted")
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append; the vote never completed
+                    continue
+                self._apply_user(record["u"], {record["c"]: record["v"]})
+                self._pending += 1
+
+    def _apply_user(self, twitch_name, user_votes):
+        # Names from before normalize_name() are merged into the lowercase
+        # login while loading; the next compaction writes them that way
+        name = normalize_name(twitch_name)
+        if name != twitch_name:
+            self._pending += 1
+        for category_id, clip_id in user_votes.items():
+            self._apply(name, category_id, clip_id)
+
+    def _apply(self, twitch_name, category_id, clip_id):
+        user_votes = self._votes.setdefault(twitch_name, {})
+        old_clip_id = user_votes.get(category_id)
+        if old_clip_id == clip_id:
+            return
+        user_votes[category_id] = clip_id
+        self._version += 1
+        counts = self._tallies.setdefault(category_id, {})
+        if old_clip_id is not None:
+            counts[old_clip_id] -= 1
+            if not counts[old_clip_id]:
+                del counts[old_clip_id]
+        counts[clip_id] = counts.get(clip_id, 0) + 1
+
+    def get_all_votes(self):
+        with self._lock:
+            return {name: dict(votes) for name, votes in self._votes.items()}
+
+    def get_user_votes(self, twitch_name):
+        with self._lock:
+            return dict(self._votes.get(twitch_name, {}))
+
+    def get_tallies(self):
+        with self._lock:
+            return {category_id: dict(counts) for category_id, counts in self._tallies.items()}
+
+    def get_version(self):
+        # Changes whenever a vote changes the tallies
+        return self._version
+
+    def record_vote(self, twitch_name, category_id, clip_id):
+        line = json.dumps({"u": twitch_name, "c": category_id, "v": clip_id}, ensure_ascii=False)
+        with self._lock:
+            self._log.write(line + "\n")
+            self._log.flush()
+            self._apply(twitch_name, category_id, clip_id)
+            self._pending += 1
+            if self._pending >= self.compact_every:
+                self._compact()
+
+    def import_votes(self, votes):
+        # Merge a votes.json-style dict into the store; imported votes win
+        with self._lock:
+            for twitch_name, user_votes in votes.items():
+                self._apply_user(twitch_name, user_votes)
+            self._compact()
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        # Snapshot first, then truncate the log. Crashing in between only means
+        # the log gets replayed over a snapshot that already contains it.
+        _write_json_atomic(self.snapshot_path, self._votes)
+        self._log.close()
+        self._log = open(self.log_path, "w", encoding="utf-8")
+        self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._compact()
+            self._log.close()
+
+
+def _migrate_clip_ids_to_slugs(conn):
+    # Votes used to store the clip's index in config.toml. clip_layout recorded
+    # which URL every index pointed at, which gives the slug; parked votes (for
+    # clips that were commented out) come back keyed by slug as well.
+    slugs = {(category_id, clip_index): get_clip_id(url) or url
+             for category_id, clip_index, url in conn.execute(
+                 "SELECT category_id, clip_index, url FROM clip_layout")}
+    rows = []
+    unmapped = 0
+    for twitch_name, category_id, clip_index, voted_at in conn.execute(
+            "SELECT twitch_name, category_id, clip_id, voted_at FROM votes"):
+        slug = slugs.get((category_id, clip_index))
+        if slug is None:
+            unmapped += 1
+            slug = str(clip_index)
+        rows.append((twitch_name, category_id, slug, voted_at))
+    parked = [(twitch_name, category_id, get_clip_id(url) or url, voted_at)
+              for twitch_name, category_id, url, voted_at in conn.execute(
+                  "SELECT twitch_name, category_id, url, voted_at FROM parked_votes")]
+
+    conn.execute("DROP TABLE votes")
+    conn.execute("DROP TABLE tallies")
+    conn.execute("DROP TABLE clip_layout")
+    conn.execute("DROP TABLE parked_votes")
+    conn.execute("""
+        CREATE TABLE votes (
+            twitch_name TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            clip_id TEXT NOT NULL,
+            voted_at REAL NOT NULL,
+            PRIMARY KEY (twitch_name, category_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE tallies (
+            category_id TEXT NOT NULL,
+            clip_id TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (category_id, clip_id)
+        ) WITHOUT ROWID
+    """)
+    conn.executemany("INSERT INTO votes VALUES (?, ?, ?, ?)", rows)
+    conn.executemany("INSERT OR IGNORE INTO votes VALUES (?, ?, ?, ?)", parked)
+    conn.execute(
+        "INSERT INTO tallies (category_id, clip_id, count) "
+        "SELECT category_id, clip_id, COUNT(*) FROM votes GROUP BY category_id, clip_id")
+    if unmapped:
+        print(f"{unmapped} stored votes had no recorded clip layout and kept their index as clip id")
+
+
+def _merge_voter_name_case(conn):
+    # Web logins used to be stored as typed while chat imports were lowercased,
+    # so one voter could have a row per spelling. Merge them under
+    # normalize_name(); where several spellings voted in a category, the
+    # latest vote wins.
+    rows = [row for row in conn.execute("SELECT twitch_name, category_id, clip_id, voted_at FROM votes")
+            if normalize_name(row[0]) != row[0]]
+    if not rows:
+        return
+    conn.executemany("DELETE FROM votes WHERE twitch_name = ? AND category_id = ?",
+                     [(twitch_name, category_id) for twitch_name, category_id, _, _ in rows])
+    conn.executemany(
+        "INSERT INTO votes (twitch_name, category_id, clip_id, voted_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (twitch_name, category_id) DO UPDATE "
+        "SET clip_id = excluded.clip_id, voted_at = excluded.voted_at WHERE excluded.voted_at > votes.voted_at",
+        [(normalize_name(twitch_name), category_id, clip_id, voted_at)
+         for twitch_name, category_id, clip_id, voted_at in rows])
+    conn.execute("DELETE FROM tallies")
+    conn.execute(
+        "INSERT INTO tallies (category_id, clip_id, count) "
+        "SELECT category_id, clip_id, COUNT(*) FROM votes GROUP BY category_id, clip_id")
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+    print(f"Merged the votes of {len({row[0] for row in rows})} voter names into their lowercase login")
+
+
+class SqliteVoteStore:
+    # One row per (voter, category) in a WAL-mode SQLite database. Every vote is
+    # a single upsert that commits atomically; WAL lets readers in other worker
+    # processes keep reading the last committed state while a write is in flight.
+    # The tallies table is updated in the same transaction as the vote, so results
+    # are read per clip instead of being recounted over every voter.
+    # clip_id is the Twitch clip slug, so edits to config.toml never move votes.
+
+    # Schema migrations, applied in order; PRAGMA user_version counts how many ran
+    MIGRATIONS = [
+        """
+        CREATE TABLE IF NOT EXISTS votes (
+            twitch_name TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            clip_id INTEGER NOT NULL,
+            voted_at REAL NOT NULL,
+            PRIMARY KEY (twitch_name, category_id)
+        ) WITHOUT ROWID;
+        """,
+        """
+        CREATE TABLE tallies (
+            category_id TEXT NOT NULL,
+            clip_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (category_id, clip_id)
+        ) WITHOUT ROWID;
+        INSERT INTO tallies (category_id, clip_id, count)
+            SELECT category_id, clip_id, COUNT(*) FROM votes GROUP BY category_id, clip_id;
+        """,
+        """
+        CREATE TABLE clip_layout (
+            category_id TEXT NOT NULL,
+            clip_index INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            PRIMARY KEY (category_id, clip_index)
+        ) WITHOUT ROWID;
+        CREATE TABLE parked_votes (
+            twitch_name TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            voted_at REAL NOT NULL,
+            PRIMARY KEY (twitch_name, category_id)
+        ) WITHOUT ROWID;
+        """,
+        _migrate_clip_ids_to_slugs,
+        """
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        INSERT INTO meta (key, value) VALUES ('version', 0);
+        """,
+        _merge_voter_name_case,
+    ]
+
+    def __init__(self, db_path, busy_timeout=10.0):
+        self.db_path = Path(db_path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._migrate(conn)
+
+    def _migrate(self, conn):
+        with _transaction(conn):
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for step in self.MIGRATIONS[version:]:
+                if callable(step):
+                    step(conn)
+                    continue
+                for statement in step.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {len(self.MIGRATIONS)}")
+
+    def _conn(self):
+        # sqlite3 connections must not cross threads or survive a fork, so keep
+        # one per thread and reopen when a forked worker inherits it
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM votes LIMIT 1").fetchone() is None
+
+    def index_vote_count(self):
+        # Votes whose clip id is a bare number: a list index from an old
+        # votes.json that was imported unconverted. Twitch slugs never are.
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM votes WHERE clip_id != '' AND clip_id NOT GLOB '*[^0-9]*'").fetchone()[0]
+
+    def get_all_votes(self):
+        votes = {}
+        rows = self._conn().execute("SELECT twitch_name, category_id, clip_id FROM votes")
+        for twitch_name, category_id, clip_id in rows:
+            votes.setdefault(twitch_name, {})[category_id] = clip_id
+        return votes
+
+    def get_user_votes(self, twitch_name):
+        rows = self._conn().execute(
+            "SELECT category_id, clip_id FROM votes WHERE twitch_name = ?", (twitch_name,))
+        return dict(rows)
+
+    def get_tallies(self):
+        tallies = {}
+        for category_id, clip_id, count in self._conn().execute(
+                "SELECT category_id, clip_id, count FROM tallies WHERE count > 0"):
+            tallies.setdefault(category_id, {})[clip_id] = count
+        return tallies
+
+    def get_version(self):
+        # A counter in the database that every write bumps in its own
+        # transaction, so it is the same for every connection and process.
+        # (PRAGMA data_version would not do: it is per connection and ignores
+        # the connection's own commits.)
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def record_vote(self, twitch_name, category_id, clip_id):
+        conn = self._conn()
+        with _transaction(conn):
+            row = conn.execute(
+                "SELECT clip_id FROM votes WHERE twitch_name = ? AND category_id = ?",
+                (twitch_name, category_id)).fetchone()
+            old_clip_id = row[0] if row else None
+            conn.execute(
+                "INSERT INTO votes (twitch_name, category_id, clip_id, voted_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (twitch_name, category_id) DO UPDATE "
+                "SET clip_id = excluded.clip_id, voted_at = excluded.voted_at",
+                (twitch_name, category_id, clip_id, time.time()))
+            self._bump_version(conn)
+            if old_clip_id == clip_id:
+                return
+            if old_clip_id is not None:
+                conn.execute(
+                    "UPDATE tallies SET count = count - 1 WHERE category_id = ? AND clip_id = ?",
+                    (category_id, old_clip_id))
+            conn.execute(
+                "INSERT INTO tallies (category_id, clip_id, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (category_id, clip_id) DO UPDATE SET count = count + 1",
+                (category_id, clip_id))
+
+    def import_votes(self, votes):
+        now = time.time()
+        rows = [(normalize_name(twitch_name), category_id, clip_id, now)
+                for twitch_name, user_votes in votes.items()
+                for category_id, clip_id in user_votes.items()]
+        conn = self._conn()
+        with _transaction(conn):
+            conn.executemany(
+                "INSERT INTO votes (twitch_name, category_id, clip_id, voted_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (twitch_name, category_id) DO UPDATE "
+                "SET clip_id = excluded.clip_id, voted_at = excluded.voted_at",
+                rows)
+            self._bump_version(conn)
+            # A bulk import is rare enough to simply recount
+            conn.execute("DELETE FROM tallies")
+            conn.execute(
+                "INSERT INTO tallies (category_id, clip_id, count) "
+                "SELECT category_id, clip_id, COUNT(*) FROM votes GROUP BY category_id, clip_id")
+
+    def compact(self):
+        # Fold the WAL back into the main database file
+        conn = self._conn()
+        with _transaction(conn):
+            self._bump_version(conn)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
+
+
+class _transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue
+    # on busy_timeout instead of failing halfway through with SQLITE_BUSY
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def open_store(backend, votes_path, db_path=None, log_path=None, catalog=None):
+    # "sqlite" is safe with several worker processes; "log" keeps everything in
+    # one process's memory and is only correct with a single worker. catalog
+    # maps votes.json files from before slugs (clip indexes) to slugs.
+    if backend == "sqlite":
+        store = SqliteVoteStore(db_path or Path(votes_path).with_suffix(".db"))
+        if store.is_empty() and Path(votes_path).exists():
+            unmapped = []
+            with open(votes_path, "r", encoding="utf-8") as f:
+                votes = dict(votes_to_slugs(iter_votes_json(f), catalog, unmapped))
+            if unmapped:
+                # Leave the store empty, so seeding is tried again after the fix
+                _report_unmapped(votes_path, unmapped, f"{store.db_path} was not seeded")
+            else:
+                store.import_votes(votes)
+        elif store.index_vote_count():
+            print(f"{store.index_vote_count()} votes in {store.db_path} are clip indexes, not slugs, and count "
+                  f"for no clip. Re-import the original votes.json to convert them: flask votes import votes.json")
+        return store
+    if backend == "log":
+        return LogVoteStore(votes_path, log_path, catalog=catalog)
+    raise ValueError(f"Unknown vote store backend: {backend!r}")